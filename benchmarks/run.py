@@ -0,0 +1,261 @@
+#! /usr/bin/env python
+"""
+Benchmarks of schema generation, encoding and API root rendering.
+
+Synthesizes a router with the requested amount of viewsets, actions,
+serializer fields and @responds decorators, then measures the latency,
+throughput and peak memory of each phase. Results are written as JSON,
+and can be compared against a previous run:
+
+    ./benchmarks/run.py --viewsets 200 --output after.json --compare before.json
+
+"""
+from __future__ import print_function
+
+import argparse
+import gc
+import json
+import os
+import platform
+import sys
+import time
+import types
+
+try:
+    import tracemalloc
+except ImportError:
+    # Python 2
+    tracemalloc = None
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+URLCONF = 'benchmarks_urls'
+
+
+def configure():
+    from django.conf import settings
+
+    settings.configure(
+        DEBUG=False,
+        DATABASES={
+            'default': {
+                'ENGINE': 'django.db.backends.sqlite3',
+                'NAME': ':memory:'
+            }
+        },
+        SECRET_KEY='not very secret in benchmarks',
+        ROOT_URLCONF=URLCONF,
+        ALLOWED_HOSTS=['*'],
+        INSTALLED_APPS=(
+            'django.contrib.auth',
+            'django.contrib.contenttypes',
+            'rest_framework',
+        ),
+    )
+
+    import django
+    django.setup()
+
+
+def make_schema(fields, depth=2):
+    schema = {}
+    for i in range(fields):
+        if depth and i % 4 == 0:
+            schema['nested%d' % i] = make_schema(fields // 2, depth - 1)
+        elif i % 3 == 0:
+            schema[('field%d' % i, 'norequired')] = 'string'
+        else:
+            schema['field%d' % i] = 'integer'
+    return schema
+
+
+def make_viewset(index, options):
+    from rest_framework import serializers, viewsets
+    from rest_framework.decorators import detail_route
+    from rest_framework.response import Response
+
+    from drf_swagger_extras.decorators import responds
+
+    serializer_class = type(str('Serializer%d' % index), (serializers.Serializer,), {
+        'field%d' % i: serializers.CharField(required=bool(i % 2),
+                                             help_text='Field %d' % i)
+        for i in range(options.fields)
+    })
+
+    attrs = {
+        '__doc__': 'Viewset number %d.\n\nWith a longer description.' % index,
+        'serializer_class': serializer_class,
+        'queryset': None,
+    }
+
+    def make_action(name):
+        def action(self, request, *args, **kwargs):
+            return Response()
+        action.__name__ = str(name)
+        action.__doc__ = 'Action %s.' % name
+        return detail_route(methods=['post'])(action)
+
+    for i in range(options.actions):
+        attrs['action%d' % i] = make_action('action%d' % i)
+
+    viewset = type(str('ViewSet%d' % index), (viewsets.ModelViewSet,), attrs)
+    for status in range(options.responses):
+        viewset = responds(
+            400 + status,
+            'Status %d' % (400 + status),
+            schema=make_schema(options.fields),
+        )(viewset)
+    return viewset
+
+
+def build_router(options):
+    from django.conf.urls import include, url
+
+    from drf_swagger_extras.routers import DefaultRouter
+
+    router = DefaultRouter(schema_title='Benchmark API')
+    for i in range(options.viewsets):
+        router.register('resource%d' % i, make_viewset(i, options),
+                        base_name='resource%d' % i)
+
+    urls = types.ModuleType(URLCONF)
+    urls.urlpatterns = [url(r'^', include(router.urls))]
+    sys.modules[URLCONF] = urls
+    return router
+
+
+def measure(func, repeat):
+    """Returns the timings of `repeat` calls and the peak memory used."""
+    gc.collect()
+    timings = []
+    for _ in range(repeat):
+        start = time.time()
+        func()
+        timings.append(time.time() - start)
+
+    # Memory is traced on a separate call, not to skew the timings
+    peak = None
+    if tracemalloc is not None:
+        tracemalloc.start()
+        func()
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    total = sum(timings)
+    return {
+        'runs': repeat,
+        'mean': total / repeat,
+        'min': min(timings),
+        'max': max(timings),
+        'per_second': repeat / total if total else None,
+        'peak_memory': peak,
+    }
+
+
+def run(options):
+    from rest_framework.test import APIClient
+
+    from drf_swagger_extras.decorators import compile_schema
+    from drf_swagger_extras.encoders import generate_swagger_object
+    from drf_swagger_extras.schemas import SchemaGenerator
+
+    # Django 1.10 moves .core.urlresolvers to .urls
+    try:
+        from django.urls import clear_url_caches
+    except ImportError:
+        from django.core.urlresolvers import clear_url_caches
+
+    start = time.time()
+    router = build_router(options)
+    clear_url_caches()
+    setup = time.time() - start
+
+    def new_generator():
+        return SchemaGenerator(title='Benchmark API',
+                               patterns=sys.modules[URLCONF].urlpatterns)
+
+    warm_generator = new_generator()
+    document = warm_generator.get_schema()
+    client = APIClient()
+
+    benchmarks = [
+        ('parse_schema', lambda: compile_schema(
+            make_schema(options.fields, depth=3))),
+        ('get_schema.cold', lambda: new_generator().get_schema()),
+        ('get_schema.warm', lambda: warm_generator.get_schema()),
+        ('generate_swagger_object', lambda: generate_swagger_object(document)),
+        ('api_root.hyperlinks', lambda: client.get('/')),
+        ('api_root.schema.cold', lambda: (
+            router.invalidate_schema_cache(),
+            client.get('/', HTTP_ACCEPT='application/vnd.coreapi+json'))),
+        ('api_root.schema.cached', lambda: client.get(
+            '/', HTTP_ACCEPT='application/vnd.coreapi+json')),
+    ]
+
+    results = {'setup': {'runs': 1, 'mean': setup}}
+    for name, func in benchmarks:
+        if options.only and not any(name.startswith(prefix)
+                                    for prefix in options.only):
+            continue
+        results[name] = measure(func, options.repeat)
+        print('%-28s %10.3f ms' % (name, results[name]['mean'] * 1000))
+
+    return results
+
+
+def compare(results, baseline):
+    print('\n%-28s %10s' % ('Compared to baseline', 'ratio'))
+    for name, result in sorted(results.items()):
+        previous = baseline['results'].get(name)
+        if previous and previous['mean']:
+            print('%-28s %9.2fx' % (name, result['mean'] / previous['mean']))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--viewsets', type=int, default=50)
+    parser.add_argument('--actions', type=int, default=2,
+                        help='Extra actions per viewset.')
+    parser.add_argument('--fields', type=int, default=8,
+                        help='Serializer fields and schema properties.')
+    parser.add_argument('--responses', type=int, default=2,
+                        help='@responds decorators per viewset.')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--only', action='append',
+                        help='Only run benchmarks starting with this name.')
+    parser.add_argument('--output', help='File to write the results to.')
+    parser.add_argument('--compare', help='Results of a previous run.')
+    options = parser.parse_args(argv)
+
+    configure()
+    results = run(options)
+
+    import django
+    import rest_framework
+    report = {
+        'environment': {
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'rest_framework': rest_framework.VERSION,
+        },
+        'parameters': {
+            'viewsets': options.viewsets,
+            'actions': options.actions,
+            'fields': options.fields,
+            'responses': options.responses,
+            'repeat': options.repeat,
+        },
+        'results': results,
+    }
+
+    if options.output:
+        with open(options.output, 'w') as fh:
+            json.dump(report, fh, indent=2, sort_keys=True)
+
+    if options.compare:
+        with open(options.compare) as fh:
+            compare(results, json.load(fh))
+
+
+if __name__ == '__main__':
+    main()
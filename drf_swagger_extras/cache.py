@@ -0,0 +1,135 @@
+"""
+Caches used to avoid regenerating schema documents.
+"""
+import hashlib
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from django.core.cache import caches
+
+NOT_CACHED = object()
+
+
+class SchemaCache(object):
+    """A thread-safe LRU cache with an optional per-entry time to live.
+
+    `maxsize` bounds the number of stored entries (least recently used
+    entries are evicted first); a `maxsize` of 0 disables caching.
+    `timeout` is the number of seconds an entry stays valid, or None
+    for entries that never expire.
+
+    """
+    def __init__(self, maxsize=128, timeout=None, timer=time.time):
+        self.maxsize = maxsize
+        self.timeout = timeout
+        self.timer = timer
+        self._data = OrderedDict()
+        self._lock = threading.RLock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                expires, value = self._data.pop(key)
+            except KeyError:
+                return default
+            if expires is not None and expires <= self.timer():
+                return default
+            # Re-insert to mark the entry as the most recently used.
+            self._data[key] = (expires, value)
+            return value
+
+    def set(self, key, value):
+        if not self.maxsize:
+            return
+        if self.timeout is None:
+            expires = None
+        else:
+            expires = self.timer() + self.timeout
+        with self._lock:
+            self._data.pop(key, None)
+            self._data[key] = (expires, value)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def invalidate(self, key=None):
+        """Drops `key` from the cache, or every entry if no key is given."""
+        with self._lock:
+            if key is None:
+                self._data.clear()
+            else:
+                self._data.pop(key, None)
+
+    def __contains__(self, key):
+        missing = object()
+        return self.get(key, missing) is not missing
+
+    def __len__(self):
+        return len(self._data)
+
+
+class SharedSchemaCache(object):
+    """Schemas shared by every process through a Django cache backend.
+
+    Entries expire after `timeout` seconds, so that those built by
+    code since deployed again do not live forever. They are built by a
+    single process at a time: others wait for up to `lock_timeout`
+    seconds for the entry to show up, and only then build it themselves.
+
+    """
+    prefix = 'drf_swagger_extras'
+    poll_interval = 0.05
+
+    def __init__(self, alias='default', timeout=3600, lock_timeout=30):
+        self.alias = alias
+        self.timeout = timeout
+        self.lock_timeout = lock_timeout
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def make_key(self, key):
+        # Bumping the generation invalidates every entry at once
+        generation = self.cache.get(self.prefix + ':generation', '')
+        digest = hashlib.sha1(repr((generation, key)).encode('utf-8'))
+        return '%s:%s' % (self.prefix, digest.hexdigest())
+
+    def get_or_build(self, key, build):
+        """Returns the entry for `key`, calling `build` if missing."""
+        cache = self.cache
+        cache_key = self.make_key(key)
+        value = cache.get(cache_key, NOT_CACHED)
+        if value is not NOT_CACHED:
+            return value
+
+        lock_key = cache_key + ':lock'
+        deadline = time.time() + self.lock_timeout
+        locked = cache.add(lock_key, True, self.lock_timeout)
+        while not locked and time.time() < deadline:
+            # Someone else is building it, wait for them
+            time.sleep(self.poll_interval)
+            value = cache.get(cache_key, NOT_CACHED)
+            if value is not NOT_CACHED:
+                return value
+            locked = cache.add(lock_key, True, self.lock_timeout)
+
+        try:
+            value = build()
+            cache.set(cache_key, value, self.timeout)
+        finally:
+            if locked:
+                cache.delete(lock_key)
+        return value
+
+    def set(self, key, value):
+        self.cache.set(self.make_key(key), value, self.timeout)
+
+    def invalidate(self, key=None):
+        """Drops `key` from the cache, or every entry if no key is given."""
+        if key is None:
+            self.cache.set(self.prefix + ':generation', uuid.uuid4().hex,
+                           None)
+        else:
+            self.cache.delete(self.make_key(key))
@@ -1,6 +1,11 @@
+from collections import OrderedDict
+
 import six
 from rest_framework import status
 
+# Where references point to named schemas in Swagger documents
+DEFINITIONS_PREFIX = '#/definitions/'
+
 
 def sanitized(schema_key):
     if type(schema_key) is tuple:
@@ -29,32 +34,144 @@ def get_object_properties(schema):
     }
 
 
-def parse_schema(schema):
-    if type(schema) is six.binary_type or type(schema) is six.text_type:
-        return {
-            'type': schema,
-        }
-    elif type(schema) is list:
+class SchemaNode(object):
+    """Immutable node of a compiled schema.
+
+    Nodes are interned: compiling the same (sub-)schema twice returns
+    the very same node, so identical schemas declared across many
+    decorators share their memory. Use `compile_schema` to build them.
+
+    """
+    __slots__ = ()
+
+    def __setattr__(self, name, value):
+        raise AttributeError('Schema nodes are immutable')
+
+    def __reduce__(self):
+        return (intern_node, (type(self),) + self._args())
+
+    def __repr__(self):
+        return '%s%r' % (type(self).__name__, self._args())
+
+    def _args(self):
+        raise NotImplementedError
+
+    def as_dict(self, refs=None, prefix=DEFINITIONS_PREFIX):
+        """Returns the Swagger representation of this schema.
+
+        Sub-schemas found in `refs`, a mapping of nodes to names, are
+        replaced by a reference to their definition, under `prefix`.
+        """
+        raise NotImplementedError
+
+    def iter_nodes(self):
+        """Yields this node and all of its descendants."""
+        yield self
+
+
+class TypeNode(SchemaNode):
+    __slots__ = ('type',)
+
+    def __init__(self, type):
+        object.__setattr__(self, 'type', type)
+
+    def _args(self):
+        return (self.type,)
+
+    def as_dict(self, refs=None, prefix=DEFINITIONS_PREFIX):
         return {
-            'type': 'list',
+            'type': self.type,
         }
-    elif type(schema) is dict:
-        title = schema.get(':title', None)
-        required_elts = list(get_required(schema.keys()))
-        properties = get_object_properties(schema)
+
+
+class ObjectNode(SchemaNode):
+    __slots__ = ('title', 'properties', 'required')
+
+    def __init__(self, title, properties, required):
+        object.__setattr__(self, 'title', title)
+        object.__setattr__(self, 'properties', properties)
+        object.__setattr__(self, 'required', required)
+
+    def _args(self):
+        return (self.title, self.properties, self.required)
+
+    def as_dict(self, refs=None, prefix=DEFINITIONS_PREFIX):
         return {
             'type': 'object',
-            'title': title,
+            'title': self.title,
             'properties': {
-                prop_name: parse_schema(subschema)
-                for prop_name, subschema in properties.items()
+                prop_name: schema_or_ref(subschema, refs, prefix)
+                for prop_name, subschema in self.properties
             },
-            'required': required_elts,
+            'required': list(self.required),
         }
+
+    def iter_nodes(self):
+        yield self
+        for prop_name, subschema in self.properties:
+            for node in subschema.iter_nodes():
+                yield node
+
+
+_interned_nodes = {}
+
+
+def intern_node(node_class, *args):
+    # Children are interned too, so they can be compared by identity
+    key = (node_class,) + args
+    node = _interned_nodes.get(key)
+    if node is None:
+        node = _interned_nodes.setdefault(key, node_class(*args))
+    return node
+
+
+def compile_schema(schema):
+    """Compiles a schema definition into an interned `SchemaNode`."""
+    if type(schema) is six.binary_type or type(schema) is six.text_type:
+        return intern_node(TypeNode, schema)
+    elif type(schema) is list:
+        return intern_node(TypeNode, 'list')
+    elif type(schema) is dict:
+        title = schema.get(':title', None)
+        required_elts = tuple(get_required(schema.keys()))
+        properties = tuple(
+            (sanitized(skey), compile_schema(subschema))
+            for skey, subschema in schema.items()
+        )
+        return intern_node(ObjectNode, title, properties, required_elts)
     else:
         raise Exception('Unsupported schema definition')
 
 
+def parse_schema(schema):
+    return compile_schema(schema).as_dict()
+
+
+# Named schemas, emitted once as definitions and referenced elsewhere
+schema_definitions = OrderedDict()
+schema_names = {}
+
+
+def register_schema(name, node):
+    registered = schema_definitions.get(name)
+    if registered is not None and registered is not node:
+        raise Exception('Schema %r is already defined differently' % name)
+    schema_definitions[name] = node
+    schema_names.setdefault(node, name)
+
+
+def get_definition_ref(name, prefix=DEFINITIONS_PREFIX):
+    return {
+        '$ref': prefix + name,
+    }
+
+
+def schema_or_ref(node, refs=None, prefix=DEFINITIONS_PREFIX):
+    if refs and node in refs:
+        return get_definition_ref(refs[node], prefix)
+    return node.as_dict(refs, prefix)
+
+
 def responds(status=status.HTTP_200_OK,
              meaning='Undocumented status code',
              schema=None,
@@ -68,7 +185,10 @@ def responds(status=status.HTTP_200_OK,
     in order to render the examples in the Web UI, an error will be
     signaled if examples= are provided without a schema= parameter.
 
-    Schemas can be easily built using a specific syntax.
+    Schemas can be easily built using a specific syntax. Naming them
+    with schema_name= emits them once under the document definitions,
+    referencing them everywhere else, including from other responses
+    which only provide the schema_name= of an already defined schema.
 
     TODO: Document the syntax here
 
@@ -80,7 +200,10 @@ def responds(status=status.HTTP_200_OK,
     obj['description'] = meaning
 
     if schema:
-        obj['schema'] = parse_schema(schema)
+        # Converted to a dict only when the document gets encoded
+        obj['schema'] = compile_schema(schema)
+        if schema_name:
+            register_schema(schema_name, obj['schema'])
 
     if schema_name:
         obj['schema_name'] = schema_name
@@ -96,3 +219,27 @@ def responds(status=status.HTTP_200_OK,
         func._responses[status] = obj
         return func
     return decorator
+
+
+def produces(*media_types):
+    """Documents the media types a view or action responds with.
+
+    Those replace the media types of its renderer classes.
+
+    """
+    def decorator(func):
+        func._produces = media_types
+        return func
+    return decorator
+
+
+def consumes(*media_types):
+    """Documents the media types a view or action accepts as input.
+
+    Those replace the media types of its parser classes.
+
+    """
+    def decorator(func):
+        func._consumes = media_types
+        return func
+    return decorator
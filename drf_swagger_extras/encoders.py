@@ -0,0 +1,480 @@
+"""
+Swagger 2.0 and OpenAPI 3.0 encoding of the documents built by our
+SchemaGenerator.
+
+Swagger follows the output of openapi_codec, extended with the
+responses, media types and schema definitions our decorators document,
+without patching openapi_codec itself. Both formats are encoded from
+the same document, so a single introspection serves them all.
+"""
+import json
+import re
+from collections import OrderedDict
+
+from coreapi.codecs import BaseCodec
+from coreapi.compat import force_bytes, urlparse
+from coreapi.document import Document
+from drf_swagger_extras.decorators import (
+    DEFINITIONS_PREFIX, ObjectNode, SchemaNode, get_definition_ref,
+    schema_definitions, schema_names, schema_or_ref
+)
+from drf_swagger_extras.profiling import timed
+from openapi_codec import OpenAPICodec
+from openapi_codec.utils import (
+    get_encoding, get_links_from_document, get_location, get_method
+)
+
+FORM_MEDIA_TYPES = ('multipart/form-data', 'application/x-www-form-urlencoded')
+
+
+def iter_response_schemas(document):
+    """Yields the (schema_name, schema node) of every documented response."""
+    for keys, link in get_links_from_document(document):
+        for response in (getattr(link, '_responses', None) or {}).values():
+            schema_name = response.get('schema_name')
+            schema = schema_definitions.get(schema_name,
+                                            response.get('schema'))
+            if isinstance(schema, SchemaNode):
+                yield schema_name, schema
+
+
+class BaseEncoder(object):
+    """Encodes a document, link by link.
+
+    Subclasses describe the top of the encoded object, each operation,
+    and the sections following the paths. `refs` maps the schema nodes
+    to reference to their name, from `get_refs`.
+
+    """
+    ref_prefix = DEFINITIONS_PREFIX
+
+    def generate_object(self, document):
+        refs = self.get_refs(document)
+        data = self.get_info(document)
+        data['paths'] = OrderedDict(self.iter_paths(document, refs))
+        data.update(self.get_sections(document, refs))
+        return data
+
+    def iter_json(self, document):
+        """Yields the JSON of the document, path by path.
+
+        The output is equivalent to encoding `generate_object`, without
+        ever holding the whole encoded object or JSON string.
+
+        """
+        refs = self.get_refs(document)
+        yield json.dumps(self.get_info(document))[:-1] + ', "paths": {'
+
+        separator = ''
+        for url, path_item in self.iter_paths(document, refs):
+            yield '%s%s: %s' % (separator, json.dumps(url),
+                                json.dumps(path_item))
+            separator = ', '
+
+        yield '}' + ''.join(
+            ', %s: %s' % (json.dumps(name), json.dumps(section))
+            for name, section in self.get_sections(document, refs).items()
+        ) + '}'
+
+    def get_refs(self, document):
+        return schema_names
+
+    def get_info(self, document):
+        raise NotImplementedError
+
+    def get_sections(self, document, refs):
+        """Returns the top-level sections following the paths."""
+        return OrderedDict()
+
+    def iter_paths(self, document, refs):
+        """Yields the (url, path item) pairs of the document."""
+        paths = OrderedDict()
+        for operation_id, link, tags in self.get_links(document):
+            url = self.get_path(document, link.url)
+            paths.setdefault(url, []).append((operation_id, link, tags))
+
+        for url, links in paths.items():
+            path_item = OrderedDict()
+            for operation_id, link, tags in links:
+                with timed('encode', (link.url, link.action.upper())):
+                    path_item[get_method(link)] = self.get_operation(
+                        operation_id, link, tags, refs)
+            yield url, path_item
+
+    def get_path(self, document, url):
+        """Returns the key of the path item of a link url."""
+        return url
+
+    def get_links(self, document):
+        """Returns a list of (operation_id, link, [tags])."""
+        links = []
+        for keys, link in get_links_from_document(document):
+            if len(keys) > 1:
+                links.append(('_'.join(keys[1:]), link, [keys[0]]))
+            else:
+                links.append((keys[0], link, []))
+
+        # Prefix operation ids with their tag, unless they are unique
+        if len(set(item[0] for item in links)) != len(links):
+            links = [
+                (tags[0] + '_' + operation_id if tags else operation_id,
+                 link, tags)
+                for operation_id, link, tags in links
+            ]
+
+        return links
+
+    def get_operation(self, operation_id, link, tags, refs):
+        raise NotImplementedError
+
+    def get_response_schema(self, response, refs):
+        schema_name = response.get('schema_name')
+        schema = response.get('schema')
+        if schema_name in schema_definitions:
+            return get_definition_ref(schema_name, self.ref_prefix)
+        elif isinstance(schema, SchemaNode):
+            return schema_or_ref(schema, refs, self.ref_prefix)
+        return schema
+
+
+class SwaggerEncoder(BaseEncoder):
+    """Builds the Swagger 2.0 object of a document in a single pass."""
+
+    def get_info(self, document):
+        parsed_url = urlparse.urlparse(document.url)
+
+        swagger = OrderedDict()
+        swagger['swagger'] = '2.0'
+        swagger['info'] = OrderedDict()
+        swagger['info']['title'] = document.title
+        swagger['info']['version'] = ''  # Required by the spec
+
+        if parsed_url.netloc:
+            swagger['host'] = parsed_url.netloc
+        if parsed_url.scheme:
+            swagger['schemes'] = [parsed_url.scheme]
+
+        return swagger
+
+    def get_sections(self, document, refs):
+        sections = OrderedDict()
+        definitions = self.get_definitions(document, refs)
+        if definitions:
+            sections['definitions'] = definitions
+        return sections
+
+    def get_operation(self, operation_id, link, tags, refs=schema_names):
+        encoding = get_encoding(link)
+        description = link.description.strip()
+
+        operation = {
+            'operationId': operation_id,
+            'responses': self.get_responses(link, refs),
+            'parameters': self.get_parameters(link, encoding),
+        }
+        if description:
+            operation['description'] = description
+            operation['summary'] = description.splitlines()[0]
+        if encoding:
+            operation['consumes'] = self.get_consumes(link, encoding)
+        if tags:
+            operation['tags'] = tags
+        produces = getattr(link, '_produces', None)
+        if produces is not None:
+            operation['produces'] = produces
+
+        return operation
+
+    def get_consumes(self, link, encoding):
+        """Returns the media types matching how the form fields are sent.
+
+        Those are either `formData` parameters, which require a form
+        media type, or the properties of a single body parameter,
+        which no form media type can encode.
+
+        """
+        consumes = getattr(link, '_consumes', None) or [encoding]
+        if any(get_location(link, field) == 'form' for field in link.fields):
+            as_form = encoding in FORM_MEDIA_TYPES
+            consumes = [
+                media_type for media_type in consumes
+                if (media_type in FORM_MEDIA_TYPES) == as_form
+            ] or [encoding]
+        return consumes
+
+    def get_parameters(self, link, encoding):
+        parameters = []
+        properties = {}
+        required = []
+
+        for field in link.fields:
+            location = get_location(link, field)
+            if location == 'form' and encoding not in FORM_MEDIA_TYPES:
+                # Form fields of other media types are properties of a
+                # single body parameter.
+                properties[field.name] = {'description': field.description}
+                if field.required:
+                    required.append(field.name)
+                continue
+
+            parameter = {
+                'name': field.name,
+                'required': field.required,
+                'in': location,
+                'description': field.description,
+            }
+            if location == 'form':
+                parameter['in'] = 'formData'
+                parameter['type'] = 'string'
+            elif location == 'body':
+                if encoding == 'application/octet-stream':
+                    parameter['schema'] = {'type': 'string',
+                                           'format': 'binary'}
+                else:
+                    parameter['schema'] = {}
+            else:
+                parameter['type'] = 'string'
+            parameters.append(parameter)
+
+        if properties:
+            parameters.append({
+                'name': 'data',
+                'in': 'body',
+                'schema': {
+                    'type': 'object',
+                    'properties': properties,
+                    'required': required,
+                }
+            })
+
+        return parameters
+
+    def get_responses(self, link, refs=schema_names):
+        """Returns documented responses based on the @responds decorator.
+
+        In case no documentation exists, the empty object is returned,
+        instead of a default, which better represents that behavior not
+        to be formally documented.
+
+        """
+        responses = getattr(link, '_responses', {})
+        if responses is None:
+            return None
+        return {
+            status: self.get_response(response, refs)
+            for status, response in responses.items()
+        }
+
+    def get_response(self, response, refs=schema_names):
+        schema = self.get_response_schema(response, refs)
+        response = dict(response)
+        response.pop('schema_name', None)
+        if schema is not None:
+            response['schema'] = schema
+        return response
+
+    def get_definitions(self, document, refs=schema_names):
+        """Returns the named schemas referenced from the document links."""
+        names = set()
+        for schema_name, schema in iter_response_schemas(document):
+            if schema_name in schema_definitions:
+                names.add(schema_name)
+            names.update(refs[node] for node in schema.iter_nodes()
+                         if node in refs)
+
+        return {
+            name: schema_definitions[name].as_dict(refs)
+            for name in sorted(names)
+        }
+
+
+class OpenAPI3Encoder(BaseEncoder):
+    """Builds the OpenAPI 3.0 object of a document in a single pass.
+
+    Schemas named with @responds are emitted under `components/schemas`,
+    along with the unnamed object schemas used more than once.
+
+    """
+    ref_prefix = '#/components/schemas/'
+
+    def get_info(self, document):
+        data = OrderedDict()
+        data['openapi'] = '3.0.0'
+        data['info'] = OrderedDict()
+        data['info']['title'] = document.title
+        data['info']['version'] = ''  # Required by the spec
+        if document.url:
+            data['servers'] = [{'url': document.url}]
+        return data
+
+    def get_path(self, document, url):
+        # Paths are relative to the server, and start with a slash
+        if document.url and url.startswith(document.url):
+            url = url[len(document.url):]
+        else:
+            url = urlparse.urlunsplit(
+                ('', '') + tuple(urlparse.urlsplit(url)[2:]))
+        return '/' + url.lstrip('/')
+
+    def get_refs(self, document):
+        """Names the schemas to emit once, as components."""
+        refs = OrderedDict()
+        seen = set()
+        for schema_name, schema in iter_response_schemas(document):
+            for node in schema.iter_nodes():
+                if node in refs:
+                    continue
+                if node in schema_names:
+                    refs[node] = schema_names[node]
+                elif isinstance(node, ObjectNode) and node in seen:
+                    refs[node] = None
+                seen.add(node)
+
+        # Name the repeated unnamed schemas after their title
+        names = set(schema_definitions)
+        for node, name in refs.items():
+            if name is None:
+                base = re.sub(r'[^\w.-]', '', node.title or '') or 'Schema'
+                name, index = base, 1
+                while name in names:
+                    index += 1
+                    name = '%s%d' % (base, index)
+                refs[node] = name
+                names.add(name)
+        return refs
+
+    def get_sections(self, document, refs):
+        schemas = dict((name, node) for node, name in refs.items())
+        # Responses reference their schema_name, even for a schema
+        # registered under several names
+        for schema_name, schema in iter_response_schemas(document):
+            if schema_name in schema_definitions:
+                schemas.setdefault(schema_name, schema)
+
+        sections = OrderedDict()
+        if schemas:
+            sections['components'] = {'schemas': OrderedDict(
+                (name, schemas[name].as_dict(refs, self.ref_prefix))
+                for name in sorted(schemas)
+            )}
+        return sections
+
+    def get_operation(self, operation_id, link, tags, refs):
+        encoding = get_encoding(link)
+        description = link.description.strip()
+
+        operation = OrderedDict()
+        operation['operationId'] = operation_id
+        if tags:
+            operation['tags'] = tags
+        if description:
+            operation['summary'] = description.splitlines()[0]
+            operation['description'] = description
+        operation['parameters'] = self.get_parameters(link)
+        if encoding:
+            operation['requestBody'] = self.get_request_body(link, encoding)
+        operation['responses'] = self.get_responses(link, refs)
+        return operation
+
+    def get_parameters(self, link):
+        return [
+            {
+                'name': field.name,
+                'in': get_location(link, field),
+                'required': field.required,
+                'description': field.description,
+                'schema': {'type': 'string'},
+            }
+            for field in link.fields
+            if get_location(link, field) not in ('form', 'body')
+        ]
+
+    def get_request_body(self, link, encoding):
+        properties = OrderedDict()
+        required = []
+        schema = None
+        for field in link.fields:
+            location = get_location(link, field)
+            if location == 'body':
+                if encoding == 'application/octet-stream':
+                    schema = {'type': 'string', 'format': 'binary'}
+                else:
+                    schema = {}
+            elif location == 'form':
+                properties[field.name] = {'description': field.description}
+                if field.required:
+                    required.append(field.name)
+
+        if schema is None:
+            schema = {'type': 'object', 'properties': properties}
+            if required:
+                schema['required'] = required
+
+        media_types = getattr(link, '_consumes', None) or [encoding]
+        return {
+            'content': OrderedDict(
+                (media_type, {'schema': schema}) for media_type in media_types
+            ),
+        }
+
+    def get_responses(self, link, refs):
+        responses = OrderedDict()
+        for status, response in (getattr(link, '_responses', None) or
+                                 {}).items():
+            responses[str(status)] = self.get_response(link, response, refs)
+        return responses
+
+    def get_response(self, link, response, refs):
+        schema = self.get_response_schema(response, refs)
+        data = OrderedDict()
+        examples = {}
+        for key, value in response.items():
+            if key == 'examples':
+                examples = value
+            elif key not in ('schema', 'schema_name'):
+                data[key] = value
+
+        content = OrderedDict()
+        if schema is not None:
+            for media_type in getattr(link, '_produces', None) or ():
+                content[media_type] = {'schema': schema}
+        for media_type, example in examples.items():
+            content.setdefault(media_type, {})['example'] = example
+        if content:
+            data['content'] = content
+        return data
+
+
+class EncoderCodec(BaseCodec):
+    """Codec encoding documents with its `encoder_class`."""
+    encoder_class = None
+
+    def encode(self, document, **options):
+        if not isinstance(document, Document):
+            raise TypeError('Expected a `coreapi.Document` instance')
+        data = self.encoder_class().generate_object(document)
+        return force_bytes(json.dumps(data))
+
+
+class SwaggerCodec(EncoderCodec, OpenAPICodec):
+    """OpenAPI codec encoding documents with a `SwaggerEncoder`."""
+    encoder_class = SwaggerEncoder
+
+
+class OpenAPI3Codec(EncoderCodec):
+    """Codec encoding documents as OpenAPI 3.0, which it cannot decode."""
+    media_type = 'application/vnd.oai.openapi+json'
+    format = 'openapi3'
+    encoder_class = OpenAPI3Encoder
+
+
+def generate_swagger_object(document):
+    return SwaggerEncoder().generate_object(document)
+
+
+def iter_swagger_json(document):
+    return SwaggerEncoder().iter_json(document)
+
+
+def generate_openapi3_object(document):
+    return OpenAPI3Encoder().generate_object(document)
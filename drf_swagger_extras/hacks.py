@@ -1,39 +1,32 @@
 """
 Monkey-patch openapi_codec to include our additional elements from
 enhanced coreapi.
+
+Nothing is patched unless `monkey_patch` gets called: prefer encoding
+documents with `drf_swagger_extras.encoders.SwaggerEncoder` (or the
+`SwaggerRenderer`), which leaves openapi_codec untouched for everyone
+else in the process. This remains for code which still encodes our
+documents through openapi_codec directly.
 """
+import openapi_codec
+from drf_swagger_extras.encoders import (
+    SwaggerEncoder, generate_swagger_object, iter_swagger_json
+)
 from openapi_codec import encode
 
+__all__ = ['generate_swagger_object', 'iter_swagger_json', 'monkey_patch']
 
-def get_responses(link):
-    """Returns documented responses based on the @responds decorator.
-
-    In case no documentation exists, the empty object is returned,
-    instead of a default, which better represents that behavior not to
-    be formally documented.
-
-    """
-    if hasattr(link, '_responses'):
-        return link._responses
 
-    return {}
+def get_responses(link):
+    return SwaggerEncoder().get_responses(link)
 
-openapi_get_operation = encode._get_operation
 
-# We need to patch get_operation if we want openapi to also give us
-# the opportunity to speak about different return formats.
 def get_operation(operation_id, link, tags):
-    operation = openapi_get_operation(operation_id, link, tags)
-    operation['produces'] = get_produces(link)
-
-    return operation
-
-
-def get_produces(link):
-    if hasattr(link, '_produces'):
-        return link._produces
+    return SwaggerEncoder().get_operation(operation_id, link, tags)
 
 
 def monkey_patch():
     encode._get_responses = get_responses
     encode._get_operation = get_operation
+    encode.generate_swagger_object = generate_swagger_object
+    openapi_codec.generate_swagger_object = generate_swagger_object
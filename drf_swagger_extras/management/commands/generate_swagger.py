@@ -0,0 +1,63 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from coreapi.codecs import CoreJSONCodec
+from drf_swagger_extras.encoders import OpenAPI3Codec, SwaggerCodec
+from drf_swagger_extras.schemas import SchemaGenerator
+
+CODECS = {
+    'openapi': SwaggerCodec,
+    'openapi3': OpenAPI3Codec,
+    'corejson': CoreJSONCodec,
+}
+
+
+class Command(BaseCommand):
+    help = ("Generates the schema document of the API ahead of time, so "
+            "that it can be served as a static file.")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'output', nargs='?',
+            help="File to write the schema to. Defaults to stdout.")
+        parser.add_argument(
+            '--title', default='',
+            help="Title of the API.")
+        parser.add_argument(
+            '--url', default=None,
+            help="Base URL of the API.")
+        parser.add_argument(
+            '--urlconf', default=None,
+            help="URLconf module to inspect. Defaults to ROOT_URLCONF.")
+        parser.add_argument(
+            '--format', default='openapi', choices=sorted(CODECS),
+            help="Format of the generated document.")
+        parser.add_argument(
+            '--workers', default=None, type=int,
+            help="Number of threads introspecting the endpoints.")
+        parser.add_argument(
+            '--fingerprint', action='store_true', default=False,
+            help="Only output a hash of what the schema is built from, "
+                 "which changes whenever the schema may change.")
+
+    def handle(self, *args, **options):
+        generator = SchemaGenerator(
+            title=options['title'],
+            url=options['url'],
+            urlconf=options['urlconf'],
+            workers=options['workers'],
+        )
+        if options['fingerprint']:
+            self.stdout.write(generator.get_fingerprint())
+            return
+
+        document = generator.get_schema()
+        if document is None:
+            raise CommandError('No API endpoints were found.')
+
+        content = CODECS[options['format']]().encode(document)
+
+        if options['output']:
+            with open(options['output'], 'wb') as fh:
+                fh.write(content)
+        else:
+            self.stdout.write(content.decode('utf-8'))
@@ -0,0 +1,116 @@
+"""
+Pre-rendered schema responses, served with ETags and optional
+precompression.
+"""
+import gzip
+import hashlib
+import io
+
+from django.http import HttpResponse, HttpResponseNotModified
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+def gzip_compress(content):
+    buf = io.BytesIO()
+    with gzip.GzipFile(fileobj=buf, mode='wb', mtime=0) as fh:
+        fh.write(content)
+    return buf.getvalue()
+
+
+def parse_accept_encoding(header):
+    """Returns the q-value of each coding of an `Accept-Encoding` header."""
+    codings = {}
+    for item in header.split(','):
+        params = item.split(';')
+        coding = params[0].strip().lower()
+        if not coding:
+            continue
+        quality = 1.0
+        for param in params[1:]:
+            name, _, value = param.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        codings[coding] = quality
+    return codings
+
+
+def get_compressors():
+    compressors = [('gzip', gzip_compress)]
+    if brotli is not None:
+        compressors.insert(0, ('br', brotli.compress))
+    return compressors
+
+
+class SchemaPayload(object):
+    """The final bytes of a rendered schema, ready to be served.
+
+    If `precompress` is set, the content is also compressed upfront
+    with every available encoding (gzip, plus brotli when the `brotli`
+    package is installed) so that serving it is just a memory copy.
+
+    """
+    def __init__(self, content, content_type, precompress=False):
+        self.content = content
+        self.content_type = content_type
+        self.digest = hashlib.sha1(content).hexdigest()
+        self.etag = self.get_etag()
+        self.encodings = []
+        if precompress:
+            self.encodings = [
+                (encoding, compress(content))
+                for encoding, compress in get_compressors()
+            ]
+
+    def get_etag(self, encoding=None):
+        # Strong ETags must differ between each encoded representation
+        if encoding:
+            return '"%s-%s"' % (self.digest, encoding)
+        return '"%s"' % self.digest
+
+    def matches(self, if_none_match):
+        """Tells whether the `If-None-Match` header matches our ETags."""
+        etags = set([self.etag])
+        etags.update(self.get_etag(encoding) for encoding, _ in self.encodings)
+        for etag in if_none_match.split(','):
+            etag = etag.strip()
+            if etag.startswith('W/'):
+                etag = etag[2:]
+            if etag == '*' or etag in etags:
+                return True
+        return False
+
+    def get_response(self, request):
+        """Return a response serving this payload to `request`.
+
+        As the content varies on `Accept-Encoding` when precompressed,
+        callers must add it to the `Vary` header of the response.
+        """
+        codings = parse_accept_encoding(
+            request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        content, content_encoding = self.content, None
+        best = 0
+        for encoding, compressed in self.encodings:
+            # Codings with q=0 are refused, even through a wildcard
+            quality = codings.get(encoding, codings.get('*', 0))
+            if quality > best:
+                content, content_encoding = compressed, encoding
+                best = quality
+
+        if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+        if if_none_match and self.matches(if_none_match):
+            response = HttpResponseNotModified()
+        else:
+            response = HttpResponse(content, content_type=self.content_type)
+            if content_encoding:
+                response['Content-Encoding'] = content_encoding
+            response['Content-Length'] = str(len(content))
+
+        response['ETag'] = self.get_etag(content_encoding)
+        return response
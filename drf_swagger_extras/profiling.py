@@ -0,0 +1,70 @@
+"""
+Timings of schema generation and encoding, per endpoint and phase.
+"""
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+_local = threading.local()
+
+
+class SchemaProfile(object):
+    """Collects the time spent on each phase of a schema generation.
+
+    `phases` holds the total seconds spent per phase, and `endpoints`
+    the seconds spent per phase for each (path, method) endpoint.
+
+    """
+    def __init__(self):
+        self.phases = OrderedDict()
+        self.endpoints = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, phase, duration, endpoint=None):
+        with self._lock:
+            self.phases[phase] = self.phases.get(phase, 0) + duration
+            if endpoint is not None:
+                phases = self.endpoints.setdefault(endpoint, OrderedDict())
+                phases[phase] = phases.get(phase, 0) + duration
+
+    @contextmanager
+    def timed(self, phase, endpoint=None):
+        start = time.time()
+        try:
+            yield
+        finally:
+            self.add(phase, time.time() - start, endpoint)
+
+    def get_server_timing(self):
+        """Returns the phase totals as a `Server-Timing` header value."""
+        return ', '.join(
+            '%s;dur=%.3f' % (phase, duration * 1000)
+            for phase, duration in self.phases.items()
+        )
+
+
+def get_active_profile():
+    return getattr(_local, 'profile', None)
+
+
+@contextmanager
+def activate(profile):
+    """Records the timings of the current thread into `profile`."""
+    previous = get_active_profile()
+    _local.profile = profile
+    try:
+        yield profile
+    finally:
+        _local.profile = previous
+
+
+@contextmanager
+def timed(phase, endpoint=None):
+    """Times the enclosed block into the active profile, if any."""
+    profile = get_active_profile()
+    if profile is None:
+        yield
+    else:
+        with profile.timed(phase, endpoint):
+            yield
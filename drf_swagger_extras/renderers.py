@@ -0,0 +1,21 @@
+from rest_framework import renderers
+
+from drf_swagger_extras.encoders import OpenAPI3Codec, SwaggerCodec
+
+
+class SwaggerRenderer(renderers.BaseRenderer):
+    """Renders schema documents as Swagger 2.0 JSON."""
+    media_type = SwaggerCodec.media_type
+    format = SwaggerCodec.format
+    charset = None
+    codec_class = SwaggerCodec
+
+    def render(self, data, media_type=None, renderer_context=None):
+        return self.codec_class().encode(data)
+
+
+class OpenAPI3Renderer(SwaggerRenderer):
+    """Renders schema documents as OpenAPI 3.0 JSON."""
+    media_type = OpenAPI3Codec.media_type
+    format = OpenAPI3Codec.format
+    codec_class = OpenAPI3Codec
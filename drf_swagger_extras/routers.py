@@ -1,64 +1,317 @@
+import hashlib
+import re
 from collections import OrderedDict
 
+import six
+from django.conf.urls import url
+from django.http import StreamingHttpResponse
+from django.test.client import RequestFactory
 from rest_framework import exceptions, views
+from rest_framework.compat import urlparse
 from rest_framework.response import Response
 from rest_framework.reverse import reverse
 from rest_framework.routers import DefaultRouter as DRFDefaultRouter
+from rest_framework.urlpatterns import format_suffix_patterns
 
-from drf_swagger_extras.schemas import SchemaGenerator
+from drf_swagger_extras.cache import NOT_CACHED, SchemaCache, SharedSchemaCache
+from drf_swagger_extras.payload import SchemaPayload
+from drf_swagger_extras.profiling import SchemaProfile, activate, timed
+from drf_swagger_extras.schemas import SchemaGenerator, class_name
 
 # Django 1.10 moves .core.urlresolvers to .urls
 try:
-    from django.urls import NoReverseMatch
+    from django.urls import NoReverseMatch, resolve
+    from django.urls import reverse as django_reverse
 except ImportError:
-    from django.core.urlresolvers import NoReverseMatch
+    from django.core.urlresolvers import NoReverseMatch, resolve
+    from django.core.urlresolvers import reverse as django_reverse
+
+
+def warm_up(*paths):
+    """
+    Build and cache the schemas of the API roots found at `paths`.
+
+    This is meant to be called before serving traffic, eg. from a
+    gunicorn `post_fork` hook, or, with `preload_app`, right after
+    loading the WSGI application so that forked workers share the
+    built schemas copy-on-write.
+    """
+    for path in paths:
+        resolve(path).func.cls.router.warm_up(path)
 
 
 class DefaultRouter(DRFDefaultRouter):
     """
     Return a view to use as the API root.
+
+    Generated schema documents are cached per `get_schema_cache_key`,
+    bounded by `schema_cache_size` entries which expire after
+    `schema_cache_timeout` seconds (never, if None), so that changes to
+    the permissions of users eventually show up.
+
+    With `schema_prerender`, the rendered bytes of each schema are
+    cached too, and served with an ETag (answering `If-None-Match`
+    with 304). `schema_precompress` additionally stores them
+    compressed for clients that accept it.
+
+    `schema_static_files` maps schema media types to files generated
+    ahead of time (see the `generate_swagger` management command).
+    Those are served as they are instead of introspecting the API,
+    thus without filtering the schema per user.
+
+    `schema_server_timing` adds a `Server-Timing` header with the time
+    spent on each phase of generating and rendering the schema.
+
+    `schema_versions` lists API versions whose schemas are served at
+    `schema/<version>/`, whatever the version of the request. Those are
+    generated together, sharing the introspection of the endpoints
+    which do not differ between versions.
+
+    `schema_streaming` streams the schemas of our Swagger and OpenAPI 3
+    renderers path by path as they get encoded, instead of rendering
+    the whole document upfront. Streamed schemas are not prerendered.
+
+    `schema_cache_alias` names a Django cache (see `CACHES`) where
+    schema documents and prerendered payloads are shared by every
+    process, keyed by `get_schema_version`. They expire after
+    `schema_cache_timeout` seconds, or `schema_shared_cache_timeout` if
+    None. Only one process builds a missing entry at a time, the others
+    waiting for it up to `schema_cache_lock_timeout` seconds.
     """
+    schema_generator_class = SchemaGenerator
+    schema_cache_timeout = 5 * 60
+    schema_cache_lock_timeout = 30
+    schema_shared_cache_timeout = 60 * 60
+    schema_view_name = 'api-schema'
+
+    def __init__(self, *args, **kwargs):
+        cache_size = kwargs.pop('schema_cache_size', 128)
+        cache_timeout = kwargs.pop('schema_cache_timeout',
+                                   self.schema_cache_timeout)
+        self.schema_cache = SchemaCache(cache_size, cache_timeout)
+        self.payload_cache = SchemaCache(cache_size, cache_timeout)
+        cache_alias = kwargs.pop('schema_cache_alias', None)
+        self.shared_schema_cache = None
+        if cache_alias is not None:
+            # Shared entries outlive the process, thus always expire
+            if cache_timeout is None:
+                cache_timeout = self.schema_shared_cache_timeout
+            self.shared_schema_cache = SharedSchemaCache(
+                cache_alias, cache_timeout, self.schema_cache_lock_timeout)
+        self.schema_prerender = kwargs.pop('schema_prerender', False)
+        self.schema_precompress = kwargs.pop('schema_precompress', False)
+        self.schema_static_files = kwargs.pop('schema_static_files', {})
+        self.schema_server_timing = kwargs.pop('schema_server_timing', False)
+        self.schema_streaming = kwargs.pop('schema_streaming', False)
+        self.schema_versions = kwargs.pop('schema_versions', None)
+        self._schema_patterns = None
+        self._schema_generator = None
+        self._schema_version = None
+        # Keyed by the version of the request, which clients control
+        self._root_paths = SchemaCache(cache_size)
+        super(DefaultRouter, self).__init__(*args, **kwargs)
+
+    def get_schema_cache_key(self, request):
+        """
+        Return the key identifying the schema that `request` may see.
+
+        Schemas are filtered by the permissions of each view, so the key
+        tells apart users, their staff status and the credentials they
+        authenticated with, along with the namespace and API version
+        the root view was reached through.
+        """
+        user = getattr(request, 'user', None)
+        is_authenticated = getattr(user, 'is_authenticated', False)
+        if callable(is_authenticated):
+            is_authenticated = is_authenticated()
+        if is_authenticated:
+            user_key = ('user', getattr(user, 'pk', None),
+                        getattr(user, 'is_staff', False),
+                        getattr(user, 'is_superuser', False),
+                        self.get_auth_cache_key(getattr(request, 'auth',
+                                                        None)))
+        else:
+            user_key = ('anonymous',)
+
+        namespace = request.resolver_match.namespace
+        return (user_key, namespace, request.version)
+
+    def get_auth_cache_key(self, auth):
+        """
+        Return a key identifying the credentials of a request, eg. a
+        token whose scope may restrict the endpoints it can access.
+        """
+        if auth is None:
+            return None
+        pk = getattr(auth, 'pk', None)
+        if pk is not None:
+            return (class_name(type(auth)), pk)
+        if isinstance(auth, six.text_type):
+            auth = auth.encode('utf-8')
+        if isinstance(auth, six.binary_type):
+            # Do not keep credentials around in cache keys
+            return hashlib.sha1(auth).hexdigest()
+        # Other credentials are not known to be the same between requests
+        return (class_name(type(auth)), id(auth))
+
+    def invalidate_schema_cache(self, request=None):
+        """
+        Drop the cached schema for `request`, or every cached schema.
+
+        Dropping every schema also drops the schema generator, along
+        with the links it keeps, so that they are introspected again.
+        """
+        shared = self.shared_schema_cache
+        if request is None:
+            self.schema_cache.invalidate()
+            self.payload_cache.invalidate()
+            self._schema_generator = None
+            self._schema_version = None
+            if shared is not None:
+                shared.invalidate()
+        else:
+            key = self.get_schema_cache_key(request)
+            document_key = ('document', key)
+            payload_keys = [
+                ('payload', key, media_type)
+                for media_type in self.get_schema_media_types()
+            ]
+            self.schema_cache.invalidate(document_key)
+            for payload_key in payload_keys:
+                self.payload_cache.invalidate(payload_key)
+            if shared is not None:
+                version = self.get_schema_version()
+                for cache_key in [document_key] + payload_keys:
+                    shared.invalidate((version,) + cache_key)
+
+    def get_schema_version(self):
+        """
+        Return a hash identifying the schemas this router may build,
+        so that processes running different code never share them.
+
+        See `SchemaGenerator.get_fingerprint`.
+        """
+        if self._schema_version is not None:
+            return self._schema_version
+
+        generator = self.get_schema_generator()
+        self._schema_version = generator.get_fingerprint()
+        return self._schema_version
+
+    def get_cached(self, cache, key, build):
+        """
+        Return the entry of `cache` at `key`, looking it up in the
+        shared cache, if any, or calling `build` when missing.
+        """
+        value = cache.get(key, NOT_CACHED)
+        if value is NOT_CACHED:
+            if self.shared_schema_cache is None:
+                value = build()
+            else:
+                value = self.shared_schema_cache.get_or_build(
+                    (self.get_schema_version(),) + key, build)
+            cache.set(key, value)
+        return value
+
+    def set_cached(self, cache, key, value):
+        """Store `value` at `key` in `cache` and the shared cache, if any."""
+        cache.set(key, value)
+        if self.shared_schema_cache is not None:
+            self.shared_schema_cache.set(
+                (self.get_schema_version(),) + key, value)
+
+    def get_schema_media_types(self):
+        return [renderer.media_type for renderer in self.schema_renderers]
+
+    def warm_up(self, path=None, media_types=None, namespace=None):
+        """
+        Request the schemas of the API root at `path` as an anonymous
+        user, building and caching them ahead of the first request.
+
+        Without a `path`, the API root is reversed, within `namespace`
+        when the router URLs are included with one.
+        """
+        if path is None:
+            view_name = self.root_view_name
+            if namespace:
+                view_name = namespace + ':' + view_name
+            path = django_reverse(view_name)
+        if media_types is None:
+            media_types = self.get_schema_media_types()
+            media_types += list(self.schema_static_files)
+
+        match = resolve(path)
+        factory = RequestFactory()
+        for media_type in media_types:
+            request = factory.get(path, HTTP_ACCEPT=media_type)
+            request.resolver_match = match
+            match.func(request, *match.args, **match.kwargs)
+
+    def get_schema_generator(self):
+        """
+        Return the schema generator of this router, building it on the
+        first call.
+        """
+        if self._schema_generator is None:
+            self._schema_generator = self.schema_generator_class(
+                title=self.schema_title,
+                url=self.schema_url,
+                patterns=self._schema_patterns
+            )
+        return self._schema_generator
+
     def get_api_root_view(self, api_urls=None):
         api_root_dict = OrderedDict()
         list_name = self.routes[0].name
         for prefix, viewset, basename in self.registry:
             api_root_dict[prefix] = list_name.format(basename=basename)
 
-            view_renderers = list(self.root_renderers)
-            schema_media_types = []
-
-            if api_urls and self.schema_title:
-                view_renderers += list(self.schema_renderers)
-                schema_generator = SchemaGenerator(
-                    title=self.schema_title,
-                    url=self.schema_url,
-                    patterns=api_urls
-                )
-            schema_media_types = [
-                renderer.media_type
-                for renderer in self.schema_renderers
-            ]
+        view_renderers = list(self.root_renderers)
+        schema_media_types = []
+
+        if api_urls and self.schema_title:
+            view_renderers += list(self.schema_renderers)
+            schema_media_types = self.get_schema_media_types()
+            # The generator is built lazily, on the first schema request
+            self._schema_patterns = api_urls
 
-        class APIRoot(views.APIView):
-            _ignore_model_permissions = True
+        class APIRoot(SchemaView):
+            router = self
             renderer_classes = view_renderers
 
             def get(self, request, *args, **kwargs):
-                if request.accepted_renderer.media_type in schema_media_types:
-                    # Return a schema response.
-                    schema = schema_generator.get_schema(request)
-                    if schema is None:
-                        raise exceptions.PermissionDenied()
-                    return Response(schema)
+                media_type = request.accepted_renderer.media_type
+                if (media_type in self.router.schema_static_files or
+                        media_type in schema_media_types):
+                    return super(APIRoot, self).get(request, *args, **kwargs)
 
                 # Return a plain {"name": "hyperlink"} response.
                 ret = OrderedDict()
+                for key, path in self.get_root_paths(request, args, kwargs):
+                    ret[key] = request.build_absolute_uri(path)
+
+                return Response(ret)
+
+            def get_root_paths(self, request, args, kwargs):
+                """
+                Return the (key, path) pairs of the root hyperlinks.
+
+                Those are reversed once per namespace, version and
+                format, and only joined with the host of each request.
+                """
                 namespace = request.resolver_match.namespace
+                cache_key = (namespace, request.version, tuple(args),
+                             tuple(sorted(kwargs.items())))
+                paths = self.router._root_paths.get(cache_key)
+                if paths is not None:
+                    return paths
+
+                paths = []
                 for key, url_name in api_root_dict.items():
                     if namespace:
                         url_name = namespace + ':' + url_name
                     try:
-                        ret[key] = reverse(
+                        url = reverse(
                             url_name,
                             args=args,
                             kwargs=kwargs,
@@ -69,7 +322,147 @@ class DefaultRouter(DRFDefaultRouter):
                         # Don't bail out if eg. no list routes exist,
                         # only detail routes.
                         continue
+                    parts = urlparse.urlsplit(url)
+                    paths.append((key, urlparse.urlunsplit(
+                        ('', '', parts.path, parts.query, parts.fragment))))
 
-                return Response(ret)
+                self.router._root_paths.set(cache_key, paths)
+                return paths
 
         return APIRoot.as_view()
+
+    def get_versioned_schema_view(self):
+        class VersionedSchema(VersionedSchemaView):
+            router = self
+            renderer_classes = list(self.schema_renderers)
+
+        return VersionedSchema.as_view()
+
+    def get_urls(self):
+        urls = super(DefaultRouter, self).get_urls()
+
+        if self.schema_versions and self.schema_title:
+            regex = r'^schema/(?P<schema_version>%s)/$' % '|'.join(
+                re.escape(version) for version in self.schema_versions)
+            schema_urls = [url(regex, self.get_versioned_schema_view(),
+                               name=self.schema_view_name)]
+            if self.include_format_suffixes:
+                schema_urls = format_suffix_patterns(schema_urls)
+            urls += schema_urls
+
+        return urls
+
+
+class SchemaView(views.APIView):
+    """
+    Serve the schema of the API of `router`, as seen by each request.
+    """
+    _ignore_model_permissions = True
+    router = None
+
+    def get(self, request, *args, **kwargs):
+        router = self.router
+        media_type = request.accepted_renderer.media_type
+        if media_type in router.schema_static_files:
+            return self.get_static_schema(request)
+
+        profile = None
+        if router.schema_server_timing:
+            profile = SchemaProfile()
+
+        key = self.get_schema_cache_key(request)
+        schema = router.get_cached(
+            router.schema_cache, ('document', key),
+            lambda: self.build_schema(request, key, profile))
+        if schema is None:
+            raise exceptions.PermissionDenied()
+        codec_class = getattr(request.accepted_renderer, 'codec_class', None)
+        encoder_class = getattr(codec_class, 'encoder_class', None)
+        if router.schema_streaming and encoder_class is not None:
+            self.add_server_timing(profile)
+            return StreamingHttpResponse(
+                encoder_class().iter_json(schema),
+                content_type=media_type)
+        if not router.schema_prerender:
+            self.add_server_timing(profile)
+            return Response(schema)
+
+        def render():
+            with activate(profile), timed('render'):
+                return self.render_schema(request, schema)
+
+        payload = router.get_cached(
+            router.payload_cache, ('payload', key, media_type), render)
+        self.add_server_timing(profile)
+        return self.serve_payload(request, payload)
+
+    def get_schema_cache_key(self, request):
+        return self.router.get_schema_cache_key(request)
+
+    def build_schema(self, request, key, profile):
+        generator = self.router.get_schema_generator()
+        return generator.get_schema(request, profile=profile)
+
+    def get_static_schema(self, request):
+        router = self.router
+        media_type = request.accepted_renderer.media_type
+        payload_key = ('static', media_type)
+        payload = router.payload_cache.get(payload_key)
+        if payload is None:
+            path = router.schema_static_files[media_type]
+            with open(path, 'rb') as fh:
+                content = fh.read()
+            payload = SchemaPayload(
+                content,
+                request.accepted_media_type,
+                precompress=router.schema_precompress,
+            )
+            router.payload_cache.set(payload_key, payload)
+        return self.serve_payload(request, payload)
+
+    def add_server_timing(self, profile):
+        if profile is not None and profile.phases:
+            self.headers['Server-Timing'] = profile.get_server_timing()
+
+    def serve_payload(self, request, payload):
+        if payload.encodings:
+            vary = self.headers.get('Vary')
+            self.headers['Vary'] = ', '.join(
+                filter(None, [vary, 'Accept-Encoding']))
+        return payload.get_response(request)
+
+    def render_schema(self, request, schema):
+        response = Response(schema)
+        response.accepted_renderer = request.accepted_renderer
+        response.accepted_media_type = request.accepted_media_type
+        response.renderer_context = self.get_renderer_context()
+        return SchemaPayload(
+            response.rendered_content,
+            response['Content-Type'],
+            precompress=self.router.schema_precompress,
+        )
+
+
+class VersionedSchemaView(SchemaView):
+    """
+    Serve the schema of the API version in the URL, whatever the
+    version of the request.
+
+    The schemas of every version in `router.schema_versions` are built
+    together, on the first request of any of them.
+    """
+    def get_schema_cache_key(self, request):
+        key = super(VersionedSchemaView, self).get_schema_cache_key(request)
+        return key[:-1] + (self.kwargs['schema_version'],)
+
+    def build_schema(self, request, key, profile):
+        router = self.router
+        schemas = router.get_schema_generator().get_schemas(
+            router.schema_versions, request, profile=profile)
+        for version, schema in schemas.items():
+            if version != key[-1]:
+                # The requested one is cached by our caller
+                router.set_cached(router.schema_cache,
+                                  ('document', key[:-1] + (version,)),
+                                  schema)
+        return schemas[key[-1]]
@@ -1,23 +1,435 @@
+import hashlib
+import inspect
+from collections import OrderedDict
 from copy import copy
 
-from rest_framework.compat import urlparse
+import six
+from django.test.client import RequestFactory
+from rest_framework import exceptions
+from rest_framework.compat import apply_markdown, urlparse
+from rest_framework.renderers import BrowsableAPIRenderer
+from rest_framework.request import Request, clone_request
 from rest_framework.schemas import SchemaGenerator as BaseSchemaGenerator
+from rest_framework.schemas import as_query_fields
 
 import coreapi
-from drf_swagger_extras.hacks import monkey_patch
+import drf_swagger_extras
+from drf_swagger_extras.cache import SchemaCache
+from drf_swagger_extras.profiling import (
+    SchemaProfile, activate, get_active_profile, timed
+)
+from drf_swagger_extras.signals import schema_profiled
 
-monkey_patch()
+try:
+    from concurrent.futures import ThreadPoolExecutor
+except ImportError:
+    # Python 2 without the `futures` backport
+    ThreadPoolExecutor = None
+
+
+def freeze(value):
+    """Returns a hashable equivalent of a (JSON-like) value."""
+    if isinstance(value, dict):
+        return tuple(sorted(
+            ((str(key), freeze(val)) for key, val in value.items()),
+            key=lambda item: item[0]
+        ))
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(val) for val in value)
+    return value
+
+
+def class_name(cls):
+    if cls is None:
+        return None
+    return '%s.%s' % (cls.__module__, cls.__name__)
+
+
+def get_serializer_class(view):
+    """Returns the serializer class `view` would use, if any."""
+    try:
+        return view.get_serializer_class()
+    except Exception:
+        # Not a generic view, one without a serializer_class, or one
+        # which needs a request to pick it.
+        return getattr(view, 'serializer_class', None)
+
+
+# Plain values of class attributes, whose repr is stable across processes
+SETTING_TYPES = six.string_types + six.integer_types + (
+    float, bool, type(None), tuple, list)
+
+# View attributes read by filter backends and pagination classes
+FILTER_SETTINGS = ('filter_class', 'filter_fields', 'search_fields',
+                   'ordering_fields', 'ordering', 'lookup_field',
+                   'lookup_url_kwarg')
+
+
+def class_settings(cls):
+    """Returns the name and plain public attributes of a class."""
+    if cls is None:
+        return None
+    return (class_name(cls),) + tuple(
+        (name, value) for name, value in sorted(inspect.getmembers(cls))
+        if not name.startswith('_') and isinstance(value, SETTING_TYPES)
+    )
+
+
+def get_serializer_definition(serializer_class):
+    """
+    Returns the fields of a serializer class, as schemas describe them,
+    or only its name when it cannot be built without a context.
+    """
+    if serializer_class is None:
+        return None
+    try:
+        fields = serializer_class().fields
+        return tuple(
+            (name, class_name(type(field)), field.source, field.required,
+             field.read_only, str(field.help_text or ''))
+            for name, field in fields.items()
+        )
+    except Exception:
+        # eg. serializers reading the request from their context
+        return class_name(serializer_class)
+
+
+_media_types = {}
+
+
+def intern_media_types(media_types):
+    """Returns a list of media types shared by all of its users."""
+    media_types = tuple(media_types)
+    interned = _media_types.get(media_types)
+    if interned is None:
+        interned = _media_types.setdefault(media_types, list(media_types))
+    return interned
+
+
+def get_media_types(classes):
+    """Returns the media types of renderer or parser classes."""
+    return intern_media_types(
+        cls.media_type for cls in classes
+        # The browsable API is for humans, not for API clients
+        if not issubclass(cls, BrowsableAPIRenderer)
+    )
+
+
+class EndpointContext(object):
+    """
+    What our decorators documented about an endpoint: the resolved
+    viewset `action` (None for plain views), the merged `responses`
+    of the view and action, its `description`, and the media types it
+    `produces` and `consumes`.
+    """
+    def __init__(self, action, responses, description, produces,
+                 consumes):
+        self.action = action
+        self.responses = responses
+        self.description = description
+        self.produces = produces
+        self.consumes = consumes
 
 
 class SchemaGenerator(BaseSchemaGenerator):
+    """
+    Schema generator including the documentation of our decorators.
+
+    Given `workers`, endpoints are introspected concurrently by as many
+    threads, which is worth it for large APIs.
+
+    Each phase of the generation is timed whenever a `SchemaProfile` is
+    given to `get_schema`, a `profile_callback` is set or a receiver is
+    connected to the `schema_profiled` signal. Those are then given the
+    profile of every generated schema.
+
+    Schemas are filtered per request by only checking the permissions
+    of each endpoint: links are built once, and requests which may
+    access the same endpoints share the same document.
+
+    The fields of each serializer class are introspected once, and
+    shared by every endpoint using it, unless the serializer class sets
+    `schema_dynamic_fields = True`. Likewise, pagination fields are
+    introspected once per pagination class, and filter fields once per
+    filter backend and view class.
+
+    `get_schemas` builds the documents of several API versions at once,
+    sharing the links of the endpoints which do not differ between them.
+    """
+    # Reuse the links of endpoints with the same fingerprint
+    cache_links = True
+    # Documents kept, one per distinct set of links requests may access
+    document_cache_size = 64
+    # Render docstrings as Markdown (requires the `markdown` package)
+    markdown_descriptions = False
+
+    def __init__(self, *args, **kwargs):
+        self.workers = kwargs.pop('workers', None)
+        self.profile_callback = kwargs.pop('profile_callback', None)
+        super(SchemaGenerator, self).__init__(*args, **kwargs)
+        self._links = {}
+        self._contexts = {}
+        self._serializer_fields = {}
+        self._query_fields = {}
+        self._documents = SchemaCache(maxsize=self.document_cache_size)
+
+    def get_schema(self, request=None, profile=None, version=None):
+        if profile is None and (self.profile_callback or
+                                schema_profiled.has_listeners(type(self))):
+            profile = SchemaProfile()
+        if profile is None:
+            return self.generate_schema(request, version)
+
+        with activate(profile):
+            with profile.timed('schema'):
+                schema = self.generate_schema(request, version)
+
+        if self.profile_callback:
+            self.profile_callback(profile)
+        schema_profiled.send(sender=type(self), generator=self,
+                             request=request, profile=profile)
+        return schema
+
+    def get_schemas(self, versions, request=None, profile=None):
+        """
+        Return an `OrderedDict` of the schema of each API version.
+
+        The URL patterns are only inspected once, and versions which do
+        not differ share their links, or even their whole document.
+        """
+        schemas = OrderedDict()
+        for version in versions:
+            schemas[version] = self.get_schema(request, profile=profile,
+                                               version=version)
+        return schemas
+
+    def generate_schema(self, request=None, version=None):
+        if self.endpoints is None:
+            self.endpoints = self.get_api_endpoints(self.patterns)
+
+        endpoints = []
+        for path, method, category, action, callback in self.endpoints:
+            view = self.create_view(path, method, callback, request, version)
+            if view is not None:
+                endpoints.append((path, method, category, action,
+                                  callback, view))
+
+        links = self.get_links(endpoints)
+        if not links:
+            return None
+        if not self.cache_links:
+            # Fresh links never share a signature
+            return self.build_document(links)
+
+        # Requests allowed to access the same links share their document.
+        # Cached documents hold their links, so ids are never reused.
+        signature = tuple(id(link) for category, action, link in links)
+        document = self._documents.get(signature)
+        if document is None:
+            document = self.build_document(links)
+            self._documents.set(signature, document)
+        return document
+
+    def build_document(self, links):
+        # Generate the schema content structure, eg:
+        # {'users': {'list': Link()}}
+        content = {}
+        for category, action, link in links:
+            if category is None:
+                content[action] = link
+            elif category in content:
+                content[category][action] = link
+            else:
+                content[category] = {action: link}
+
+        # Return the schema document.
+        return coreapi.Document(title=self.title, content=content,
+                                url=self.url)
+
+    def create_view(self, path, method, callback, request=None,
+                    version=None):
+        """
+        Return the view instance serving the given endpoint, or None if
+        `request` is not allowed to access it.
+
+        Given a `version`, it replaces the version of the request of the
+        view, which is then never None.
+        """
+        view = callback.cls()
+        for attr, val in getattr(callback, 'initkwargs', {}).items():
+            setattr(view, attr, val)
+        view.args = ()
+        view.kwargs = {}
+        view.format_kwarg = None
+
+        actions = getattr(callback, 'actions', None)
+        if actions is not None:
+            if method == 'OPTIONS':
+                view.action = 'metadata'
+            else:
+                view.action = actions.get(method.lower())
+
+        if request is not None:
+            view.request = clone_request(request, method)
+            try:
+                view.check_permissions(view.request)
+            except exceptions.APIException:
+                return None
+        else:
+            view.request = None
+
+        if version is not None:
+            if view.request is None:
+                # Only tells the view its version, without filtering
+                view.request = Request(RequestFactory().generic(method, path))
+            view.request.version = version
+
+        return view
+
+    def get_links(self, endpoints):
+        """
+        Return the (category, action, link) of each endpoint, in order.
+        """
+        def get_link(endpoint):
+            path, method, category, action, callback, view = endpoint
+            return (category, action,
+                    self.get_link(path, method, callback, view))
+
+        if self.workers and ThreadPoolExecutor is not None:
+            profile = get_active_profile()
+
+            def get_link_in_thread(endpoint):
+                with activate(profile):
+                    return get_link(endpoint)
+
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                return list(executor.map(get_link_in_thread, endpoints))
+        return [get_link(endpoint) for endpoint in endpoints]
+
+    def refresh(self):
+        """
+        Inspect the URL patterns again, keeping the cached links of the
+        endpoints that still exist.
+        """
+        self.endpoints = self.get_api_endpoints(self.patterns)
+        alive = set(
+            (path, method, callback.cls)
+            for path, method, category, action, callback in self.endpoints
+        )
+        for key in list(self._links):
+            if key not in alive:
+                del self._links[key]
+        self._contexts.clear()
+        self._serializer_fields.clear()
+        self._query_fields.clear()
+        self._documents.invalidate()
+
+    def get_fingerprint(self):
+        """
+        Return a hash which changes whenever the schema may change.
+
+        Only the endpoints and the classes serving them are inspected,
+        without checking permissions or building links, so this is much
+        cheaper than generating the schema itself. Views are created
+        without a request: serializer classes which `get_serializer_class`
+        can only pick per request are not taken into account.
+        """
+        if self.endpoints is None:
+            self.endpoints = self.get_api_endpoints(self.patterns)
+
+        digest = hashlib.sha1(repr((
+            drf_swagger_extras.__version__, self.title, self.url,
+            self.markdown_descriptions,
+        )).encode('utf-8'))
+        serializers = {}
+        for path, method, category, action, callback in self.endpoints:
+            view = self.create_view(path, method, callback)
+            view_class = callback.cls
+            view_action = self._get_actual_view(method, callback, view_class,
+                                                default=False)
+            serializer_class = get_serializer_class(view)
+            if serializer_class not in serializers:
+                serializers[serializer_class] = get_serializer_definition(
+                    serializer_class)
+            digest.update(repr((
+                path, method, category, action, class_name(view_class),
+                freeze(getattr(callback, 'initkwargs', None)),
+                view_class.__doc__, getattr(view_action, '__doc__', None),
+                serializers[serializer_class],
+                tuple(class_settings(backend) for backend in
+                      getattr(view, 'filter_backends', None) or ()),
+                class_settings(getattr(view, 'pagination_class', None)),
+                tuple(freeze(getattr(view, attr, None))
+                      for attr in FILTER_SETTINGS),
+                tuple(class_name(permission)
+                      for permission in view.permission_classes),
+                tuple(class_name(renderer)
+                      for renderer in view.renderer_classes),
+                tuple(class_name(parser)
+                      for parser in view.parser_classes),
+            ) + tuple(
+                freeze(getattr(obj, attr, None))
+                for obj in (view_class, view_action)
+                for attr in ('_responses', '_produces', '_consumes')
+            )).encode('utf-8'))
+        return digest.hexdigest()
+
+    def get_link_fingerprint(self, path, method, callback, view):
+        """
+        Return a value which changes whenever the link of the endpoint
+        would change.
+        """
+        action = self._get_actual_view(method, callback, view, default=False)
+        return (
+            get_serializer_class(view),
+            tuple(getattr(view, 'filter_backends', None) or ()),
+            getattr(view, 'pagination_class', None),
+            tuple(view.renderer_classes),
+            tuple(view.parser_classes),
+        ) + tuple(
+            freeze(getattr(obj, attr, None))
+            for obj in (view, action)
+            for attr in ('_responses', '_produces', '_consumes')
+        )
+
     def get_link(self, path, method, callback, view):
         """
         Return a `coreapi.Link` instance for the given endpoint.
         """
-        fields = self.get_path_fields(path, method, callback, view)
-        fields += self.get_serializer_fields(path, method, callback, view)
-        fields += self.get_pagination_fields(path, method, callback, view)
-        fields += self.get_filter_fields(path, method, callback, view)
+        if not self.cache_links:
+            # Nothing tells whether the endpoint changed since its
+            # context was resolved, so resolve it again
+            self._contexts.pop((callback, method), None)
+            return self.build_link(path, method, callback, view)
+
+        # Links are kept per fingerprint, as eg. versions of the same
+        # endpoint may differ.
+        key = (path, method, callback.cls)
+        fingerprint = self.get_link_fingerprint(path, method, callback, view)
+        links = self._links.setdefault(key, {})
+        link = links.get(fingerprint)
+        if link is not None:
+            return link
+
+        # The endpoint changed, so its context has to be resolved again
+        self._contexts.pop((callback, method), None)
+        link = self.build_link(path, method, callback, view)
+        links[fingerprint] = link
+        return link
+
+    def build_link(self, path, method, callback, view):
+        """
+        Introspect the given endpoint into a new `coreapi.Link`.
+        """
+        endpoint = (path, method)
+        with timed('path_fields', endpoint):
+            fields = self.get_path_fields(path, method, callback, view)
+        with timed('serializer_fields', endpoint):
+            fields += self.get_serializer_fields(path, method, callback, view)
+        with timed('pagination_fields', endpoint):
+            fields += self.get_pagination_fields(path, method, callback, view)
+        with timed('filter_fields', endpoint):
+            fields += self.get_filter_fields(path, method, callback, view)
 
         if fields and any([field.location in ('form', 'body')
                            for field in fields]):
@@ -25,21 +437,86 @@ class SchemaGenerator(BaseSchemaGenerator):
         else:
             encoding = None
 
-        description = self.get_description(path, method, callback, view)
+        with timed('description', endpoint):
+            description = self.get_description(path, method, callback, view)
 
-        link = coreapi.Link(
-            url=urlparse.urljoin(self.url, path),
-            action=method.lower(),
-            encoding=encoding,
-            description=description,
-            fields=fields,
-            transform=None,  # Not handled, but here for future reference
-        )
-        link._responses = self.get_responses(path, method, callback, view)
-        link._produces = self.get_produces(path, method, callback, view)
+        with timed('link', endpoint):
+            link = coreapi.Link(
+                url=urlparse.urljoin(self.url, path),
+                action=method.lower(),
+                encoding=encoding,
+                description=description,
+                fields=fields,
+                transform=None,  # Not handled, but here for future reference
+            )
+        with timed('responses', endpoint):
+            link._responses = self.get_responses(path, method, callback, view)
+        with timed('produces', endpoint):
+            link._produces = self.get_produces(path, method, callback, view)
+            link._consumes = self.get_consumes(path, method, callback, view)
 
         return link
 
+    def get_serializer_fields(self, path, method, callback, view):
+        if (method not in ('PUT', 'PATCH', 'POST') or
+                not hasattr(view, 'get_serializer_class')):
+            return super(SchemaGenerator, self).get_serializer_fields(
+                path, method, callback, view)
+
+        serializer_class = view.get_serializer_class()
+        if getattr(serializer_class, 'schema_dynamic_fields', False):
+            return super(SchemaGenerator, self).get_serializer_fields(
+                path, method, callback, view)
+
+        # Fields only differ on partial updates, which require none
+        key = (serializer_class, method == 'PATCH')
+        fields = self._serializer_fields.get(key)
+        if fields is None:
+            fields = super(SchemaGenerator, self).get_serializer_fields(
+                path, method, callback, view)
+            self._serializer_fields[key] = fields
+        return list(fields)
+
+    def is_list_endpoint(self, method, callback):
+        if method != 'GET':
+            return False
+        actions = getattr(callback, 'actions', None)
+        return actions is None or 'list' in actions.values()
+
+    def get_query_fields(self, key, get_fields):
+        """
+        Return the query fields cached at `key`, calling `get_fields`
+        for them on the first call.
+        """
+        fields = self._query_fields.get(key)
+        if fields is None:
+            fields = tuple(as_query_fields(get_fields()))
+            self._query_fields[key] = fields
+        return list(fields)
+
+    def get_pagination_fields(self, path, method, callback, view):
+        pagination_class = getattr(view, 'pagination_class', None)
+        if not pagination_class:
+            return []
+        if not self.is_list_endpoint(method, callback):
+            return []
+
+        return self.get_query_fields(
+            ('pagination', pagination_class),
+            lambda: pagination_class().get_fields(view))
+
+    def get_filter_fields(self, path, method, callback, view):
+        if not self.is_list_endpoint(method, callback):
+            return []
+
+        fields = []
+        for filter_backend in getattr(view, 'filter_backends', None) or ():
+            # Backends may depend on the view, eg. on its `filter_fields`
+            fields += self.get_query_fields(
+                ('filter', filter_backend, type(view)),
+                lambda: filter_backend().get_fields(view))
+        return fields
+
     def _get_actual_view(self, method, callback, view, default=True):
         if hasattr(callback, 'actions'):
             action_name = callback.actions[method.lower()]
@@ -48,36 +525,103 @@ class SchemaGenerator(BaseSchemaGenerator):
         else:
             return view if default else None
 
-    def get_responses(self, path, method, callback, view):
+    def get_endpoint_context(self, path, method, callback, view):
+        """
+        Return the `EndpointContext` of the given endpoint, resolving it
+        only once for all the `get_*` hooks.
+        """
+        key = (callback, method)
+        context = self._contexts.get(key)
+        if context is None:
+            context = self.create_endpoint_context(path, method,
+                                                   callback, view)
+            self._contexts[key] = context
+        return context
+
+    def create_endpoint_context(self, path, method, callback, view):
+        # Resolve the action on the class, as views are per request
+        view_class = type(view)
+        action = self._get_actual_view(method, callback, view_class,
+                                       default=False)
+
         # Get generic responses
         responses = {}
-        if hasattr(view, '_responses'):
-            responses = copy(view._responses)
-            pass
-
-        action = self._get_actual_view(method, callback, view, default=False)
+        if hasattr(view_class, '_responses'):
+            responses = copy(view_class._responses)
         if action and hasattr(action, '_responses'):
             responses.update(action._responses)
-        return responses or None
+
+        if action and action.__doc__:
+            description = self._get_description(view_class, action)
+        else:
+            description = self._get_description(view_class, None)
+
+        # Renderers and parsers may be overridden per action initkwargs
+        produces = getattr(action, '_produces',
+                           getattr(view_class, '_produces', None))
+        if produces is None:
+            produces = get_media_types(view.renderer_classes)
+        consumes = getattr(action, '_consumes',
+                           getattr(view_class, '_consumes', None))
+        if consumes is None:
+            consumes = get_media_types(view.parser_classes)
+
+        return EndpointContext(
+            action=action,
+            responses=responses or None,
+            description=description,
+            produces=intern_media_types(produces),
+            consumes=intern_media_types(consumes),
+        )
+
+    def get_responses(self, path, method, callback, view):
+        context = self.get_endpoint_context(path, method, callback, view)
+        return context.responses
 
     def get_produces(self, path, method, callback, view):
-        return ["application/json", "application/xml"]
+        context = self.get_endpoint_context(path, method, callback, view)
+        return context.produces
+
+    def get_consumes(self, path, method, callback, view):
+        context = self.get_endpoint_context(path, method, callback, view)
+        return context.consumes
 
     def get_description(self, path, method, callback, view):
-        action = self._get_actual_view(method, callback, view, default=False)
-        if action and action.__doc__:
-            return self._get_description(view, action)
-        else:
-            return self._get_description(view, None)
+        context = self.get_endpoint_context(path, method, callback, view)
+        return context.description
 
     def _get_description(self, view, action=None):
         generic = view.__doc__
         specific = action.__doc__
 
-        return description_format(generic, specific)
+        return description_format(generic, specific,
+                                  markdown=self.markdown_descriptions)
+
+
+_descriptions = SchemaCache(maxsize=1024)
+
+
+def description_format(generic=None, specific=None, markdown=False):
+    """
+    Joins the docstrings of a view and its action into a description.
+
+    Descriptions are memoized, as the same class docstring is formatted
+    for every route of a viewset. With `markdown`, the description is
+    rendered to HTML, if the `markdown` package is installed.
+    """
+    key = (generic, specific, markdown)
+    description = _descriptions.get(key, key)
+    if description is not key:
+        return description
+
+    description = _description_format(generic, specific)
+    if description and markdown and apply_markdown is not None:
+        description = apply_markdown(description)
+    _descriptions.set(key, description)
+    return description
 
 
-def description_format(generic=None, specific=None):
+def _description_format(generic=None, specific=None):
     def unwrap(s):
         if s:
             return "\n".join([l.strip() for l in s.splitlines()])
@@ -0,0 +1,10 @@
+from django.dispatch import Signal
+
+# Sent by SchemaGenerator once a schema has been generated while
+# profiling, with the `generator`, the `request` and its `profile`.
+schema_profiled = Signal()
+
+# Sent by the response validators of `drf_swagger_extras.validation` when
+# a response does not match its documented schema, with the `view`, the
+# `request`, the `response` and the list of `errors` found.
+response_violated = Signal()
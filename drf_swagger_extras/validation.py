@@ -0,0 +1,231 @@
+"""
+Sampled validation of the responses of views against the schemas they
+document with the @responds decorator.
+
+Violations never fail the request: they are sent through the
+`response_violated` signal.
+"""
+import numbers
+import random
+
+import six
+from drf_swagger_extras.decorators import (
+    ObjectNode, TypeNode, schema_definitions
+)
+from drf_swagger_extras.signals import response_violated
+
+try:
+    from collections.abc import Mapping
+except ImportError:
+    # Python 2
+    from collections import Mapping
+
+# Django 1.10 introduces new style middlewares
+try:
+    from django.utils.deprecation import MiddlewareMixin
+except ImportError:
+    MiddlewareMixin = object
+
+PYTHON_TYPES = {
+    'string': six.string_types,
+    'integer': six.integer_types,
+    'number': numbers.Number,
+    'boolean': bool,
+    'list': (list, tuple),
+    'array': (list, tuple),
+    'object': Mapping,
+}
+
+
+def skip_validation(value, path, errors):
+    pass
+
+
+def compile_validator(node):
+    """Compiles a `SchemaNode` into a `validate(value, path, errors)`.
+
+    Validators append a message to `errors` per mismatch found. Null
+    values are always accepted, as Swagger 2.0 has no way to declare
+    them, and so are the types they do not know about.
+
+    """
+    if isinstance(node, ObjectNode):
+        # Keys such as ':title' describe the schema, not the object
+        required = tuple(name for name in node.required
+                         if not name.startswith(':'))
+        properties = tuple(
+            (name, get_validator(subschema))
+            for name, subschema in node.properties
+            if not name.startswith(':')
+        )
+
+        def validate_object(value, path, errors):
+            if value is None:
+                return
+            if not isinstance(value, Mapping):
+                errors.append('%s: expected an object' % path)
+                return
+            for name in required:
+                if name not in value:
+                    errors.append('%s.%s: missing' % (path, name))
+            for name, validate in properties:
+                if name in value:
+                    validate(value[name], path + '.' + name, errors)
+
+        return validate_object
+
+    assert isinstance(node, TypeNode)
+    python_types = PYTHON_TYPES.get(node.type)
+    if python_types is None:
+        return skip_validation
+    # bool is an integer in Python, but not in JSON
+    allows_bool = node.type == 'boolean'
+
+    def validate_type(value, path, errors):
+        if value is None:
+            return
+        if (not isinstance(value, python_types) or
+                (isinstance(value, bool) and not allows_bool)):
+            errors.append('%s: expected %s' % (path, node.type))
+
+    return validate_type
+
+
+_validators = {}
+
+
+def get_validator(node):
+    """Returns the validator of a node, compiling it only once."""
+    validator = _validators.get(node)
+    if validator is None:
+        validator = _validators.setdefault(node, compile_validator(node))
+    return validator
+
+
+def get_view_responses(view_class, action):
+    """Returns the responses documented for an action of a view class."""
+    responses = dict(getattr(view_class, '_responses', None) or {})
+    handler = getattr(view_class, action, None) if action else None
+    responses.update(getattr(handler, '_responses', None) or {})
+    return responses
+
+
+_response_schemas = {}
+
+
+def get_response_schema(view, status_code):
+    """Returns the `SchemaNode` documented for a response of `view`."""
+    action = getattr(view, 'action', None)
+    request = getattr(view, 'request', None)
+    if action is None and request is not None:
+        # Plain API views handle each method with a method
+        action = request.method.lower()
+    key = (type(view), action, status_code)
+    try:
+        return _response_schemas[key]
+    except KeyError:
+        pass
+
+    responses = get_view_responses(type(view), action)
+    response = responses.get(status_code)
+    if response is None:
+        response = responses.get(str(status_code), responses.get('default'))
+    schema = None
+    if response is not None:
+        schema = response.get('schema')
+        if schema is None:
+            schema = schema_definitions.get(response.get('schema_name'))
+    return _response_schemas.setdefault(key, schema)
+
+
+class ResponseValidator(object):
+    """Validates a sample of responses against their documented schema.
+
+    `sample_rate` is the fraction of responses validated, and `max_size`
+    the size in bytes above which rendered responses are not validated
+    (None for no limit).
+
+    """
+    def __init__(self, sample_rate=0.01, max_size=64 * 1024,
+                 random=random.random):
+        self.sample_rate = sample_rate
+        self.max_size = max_size
+        self.random = random
+
+    def sample(self):
+        return self.sample_rate and self.random() < self.sample_rate
+
+    def validate(self, view, response):
+        """Returns the violations found in a (DRF) response of `view`."""
+        if response.streaming or not hasattr(response, 'data'):
+            return []
+        if (self.max_size is not None and response.is_rendered and
+                len(response.content) > self.max_size):
+            return []
+
+        schema = get_response_schema(view, response.status_code)
+        if schema is None:
+            return []
+
+        errors = []
+        get_validator(schema)(response.data, '$', errors)
+        if errors:
+            self.report(view, response, errors)
+        return errors
+
+    def report(self, view, response, errors):
+        response_violated.send(sender=type(view), view=view,
+                               request=view.request, response=response,
+                               errors=errors)
+
+
+class ResponseValidationMixin(object):
+    """View mixin validating a sample of its responses.
+
+    Responses are validated once rendered, so that oversized ones are
+    skipped.
+
+    """
+    response_validator_class = ResponseValidator
+    response_validation_rate = 0.01
+    response_validation_max_size = 64 * 1024
+
+    def get_response_validator(self):
+        return self.response_validator_class(
+            self.response_validation_rate,
+            self.response_validation_max_size,
+        )
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super(ResponseValidationMixin, self).finalize_response(
+            request, response, *args, **kwargs)
+        validator = self.get_response_validator()
+        if validator.sample() and hasattr(response, 'data'):
+            def validate(response):
+                validator.validate(self, response)
+            response.add_post_render_callback(validate)
+        return response
+
+
+class ResponseValidationMiddleware(MiddlewareMixin):
+    """Validates a sample of the responses of every API view.
+
+    Subclass it to change the sampling rate or maximum size.
+
+    """
+    response_validator_class = ResponseValidator
+    response_validation_rate = 0.01
+    response_validation_max_size = 64 * 1024
+
+    def __init__(self, *args, **kwargs):
+        super(ResponseValidationMiddleware, self).__init__(*args, **kwargs)
+        self.validator = self.response_validator_class(
+            self.response_validation_rate,
+            self.response_validation_max_size,
+        )
+
+    def process_response(self, request, response):
+        view = (getattr(response, 'renderer_context', None) or {}).get('view')
+        if view is not None and self.validator.sample():
+            self.validator.validate(view, response)
+        return response
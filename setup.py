@@ -43,7 +43,7 @@ setup(
         'Topic :: Software Development :: Documentation',
     ],
     # keywords='',
-    packages=['drf_swagger_extras'],
+    packages=find_packages(exclude=['tests', 'tests.*']),
     install_requires=['djangorestframework~=3.4', 'coreapi~=2.0.8', 'openapi-codec~=1.1.4', 'six~=1.10'],
     extras_require={
         'dev': ['pypandoc~=1.2'],
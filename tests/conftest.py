@@ -35,6 +35,7 @@ def pytest_configure():
             'django.contrib.staticfiles',
             'rest_framework',
             'rest_framework.authtoken',
+            'drf_swagger_extras',
             'tests',
         ),
         PASSWORD_HASHERS=(
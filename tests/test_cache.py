@@ -0,0 +1,58 @@
+from __future__ import unicode_literals
+
+from django.test import TestCase
+
+from drf_swagger_extras.cache import SchemaCache
+
+
+class FakeTimer(object):
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        return self.now
+
+
+class TestSchemaCache(TestCase):
+    def test_get_set(self):
+        cache = SchemaCache()
+        cache.set('a', 1)
+        self.assertEqual(cache.get('a'), 1)
+        self.assertEqual(cache.get('b', 2), 2)
+        self.assertIn('a', cache)
+        self.assertNotIn('b', cache)
+
+    def test_lru_eviction(self):
+        cache = SchemaCache(maxsize=2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+        self.assertIn('a', cache)
+        self.assertNotIn('b', cache)
+        self.assertIn('c', cache)
+        self.assertEqual(len(cache), 2)
+
+    def test_timeout(self):
+        timer = FakeTimer()
+        cache = SchemaCache(timeout=10, timer=timer)
+        cache.set('a', 1)
+        timer.now = 9
+        self.assertEqual(cache.get('a'), 1)
+        timer.now = 10
+        self.assertIsNone(cache.get('a'))
+
+    def test_disabled(self):
+        cache = SchemaCache(maxsize=0)
+        cache.set('a', 1)
+        self.assertNotIn('a', cache)
+
+    def test_invalidate(self):
+        cache = SchemaCache()
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.invalidate('a')
+        self.assertNotIn('a', cache)
+        self.assertIn('b', cache)
+        cache.invalidate()
+        self.assertEqual(len(cache), 0)
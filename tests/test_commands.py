@@ -0,0 +1,63 @@
+from __future__ import unicode_literals
+
+import json
+import os
+import shutil
+import tempfile
+
+from django.core.management import CommandError, call_command
+from django.test import TestCase
+from django.utils.six import StringIO
+
+urlpatterns = []
+
+
+class TestGenerateSwagger(TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_writes_swagger_file(self):
+        path = os.path.join(self.tmpdir, 'swagger.json')
+        call_command('generate_swagger', path, title='Example API',
+                     urlconf='tests.test_decorators')
+
+        with open(path) as fh:
+            swagger = json.load(fh)
+
+        self.assertEqual(swagger['swagger'], '2.0')
+        self.assertEqual(swagger['info']['title'], 'Example API')
+        operation = swagger['paths']['/example/{pk}/custom_action/']['post']
+        self.assertEqual(operation['responses']['200']['description'],
+                         'Always')
+        self.assertIn('produces', operation)
+
+    def test_writes_to_stdout(self):
+        out = StringIO()
+        call_command('generate_swagger', format='corejson',
+                     urlconf='tests.test_decorators', stdout=out)
+        self.assertEqual(json.loads(out.getvalue())['_type'], 'document')
+
+    def test_writes_openapi3(self):
+        out = StringIO()
+        call_command('generate_swagger', format='openapi3',
+                     urlconf='tests.test_decorators', stdout=out)
+        self.assertEqual(json.loads(out.getvalue())['openapi'], '3.0.0')
+
+    def test_no_endpoints(self):
+        self.assertRaises(CommandError, call_command, 'generate_swagger',
+                          urlconf='tests.test_commands')
+
+    def test_fingerprint(self):
+        out = StringIO()
+        call_command('generate_swagger', fingerprint=True,
+                     urlconf='tests.test_decorators', stdout=out)
+        fingerprint = out.getvalue().strip()
+        self.assertEqual(len(fingerprint), 40)
+
+        out = StringIO()
+        call_command('generate_swagger', fingerprint=True,
+                     urlconf='tests.test_schemas', stdout=out)
+        self.assertNotEqual(out.getvalue().strip(), fingerprint)
@@ -5,21 +5,35 @@ Tests for schema generation.
 from __future__ import print_function, unicode_literals
 
 import json
+import pickle
 import unittest
 
 from django.conf.urls import include, url
 from django.test import TestCase, override_settings
-from rest_framework import filters, pagination, permissions, serializers
+from rest_framework import (
+    filters, pagination, parsers, permissions, serializers
+)
 from rest_framework.compat import coreapi
 from rest_framework.decorators import detail_route, list_route
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework.viewsets import ModelViewSet
 
-from drf_swagger_extras.decorators import responds
+from drf_swagger_extras.decorators import (
+    compile_schema, consumes, parse_schema, produces, responds
+)
+from drf_swagger_extras.encoders import (
+    OpenAPI3Codec, OpenAPI3Encoder, SwaggerCodec, generate_openapi3_object,
+    generate_swagger_object, iter_swagger_json
+)
 from drf_swagger_extras.routers import DefaultRouter
 from drf_swagger_extras.schemas import SchemaGenerator, description_format
-from openapi_codec.encode import generate_swagger_object
+from openapi_codec.utils import get_links_from_document
+
+FORM_MEDIA_TYPES = ['application/json',
+                    'application/x-www-form-urlencoded',
+                    'multipart/form-data']
+
 
 def to_dict(a):
     return json.loads(json.dumps(a))
@@ -132,7 +146,7 @@ class TestDecoratorSchemaWorks(TestCase):
                         'operationId': 'read',
                         'parameters': [],
                         'tags': ['different-example'],
-                        'produces': ['application/json', 'application/xml'],
+                        'produces': ['application/json'],
                         'responses': {'default': {'description': 'Test'}}
                     }
                 }
@@ -142,6 +156,287 @@ class TestDecoratorSchemaWorks(TestCase):
         self.assertEquals(to_dict(schema), expected)
 
 
+class TestCompiledSchema(TestCase):
+    schema = {
+        ('details', 'norequired'): 'string',
+        'nested': {
+            'key': [],
+        },
+    }
+
+    def test_interned(self):
+        node = compile_schema(self.schema)
+        self.assertIs(node, compile_schema(dict(self.schema)))
+        self.assertIs(dict(node.properties)['nested'],
+                      compile_schema({'key': []}))
+
+    def test_immutable(self):
+        node = compile_schema(self.schema)
+        self.assertRaises(AttributeError, setattr, node, 'title', 'Other')
+
+    def test_pickle(self):
+        node = compile_schema(self.schema)
+        self.assertIs(pickle.loads(pickle.dumps(node)), node)
+
+    def test_as_dict(self):
+        self.assertEqual(parse_schema(self.schema), {
+            'type': 'object',
+            'title': None,
+            'required': ['nested'],
+            'properties': {
+                'details': {'type': 'string'},
+                'nested': {
+                    'type': 'object',
+                    'title': None,
+                    'required': ['key'],
+                    'properties': {'key': {'type': 'list'}},
+                },
+            },
+        })
+
+    def test_shared_by_decorators(self):
+        @responds(400, 'Bad request', schema={'error': 'string'})
+        def first():
+            pass
+
+        @responds(400, 'Bad request', schema={'error': 'string'})
+        def second():
+            pass
+
+        self.assertIs(first._responses[400]['schema'],
+                      second._responses[400]['schema'])
+
+
+@unittest.skipUnless(coreapi, 'coreapi is not installed')
+class TestMediaTypes(TestCase):
+    def test_produces_consumes_decorators(self):
+        @produces('application/pdf')
+        @consumes('application/xml')
+        class DocumentView(APIView):
+            def post(self, request, *args, **kwargs):
+                return Response()
+
+        schema_generator = SchemaGenerator(
+            title='Test View',
+            patterns=[url('^document/$', DocumentView.as_view())]
+        )
+        schema = to_dict(generate_swagger_object(
+            schema_generator.get_schema()))
+        operation = schema['paths']['/document/']['post']
+        self.assertEqual(operation['produces'], ['application/pdf'])
+        self.assertNotIn('consumes', operation)
+
+    def test_action_decorators(self):
+        class DocumentViewSet(ExampleViewSet):
+            @produces('application/pdf')
+            @consumes('application/xml')
+            @detail_route(methods=['post'])
+            def render(self, request, pk):
+                return Response()
+
+        schema_generator = SchemaGenerator(
+            title='Test View',
+            patterns=[url(r'^(?P<pk>\d+)/render/$',
+                          DocumentViewSet.as_view({'post': 'render'}))]
+        )
+        schema = to_dict(generate_swagger_object(
+            schema_generator.get_schema()))
+        operation = schema['paths']['/{pk}/render/']['post']
+        self.assertEqual(operation['produces'], ['application/pdf'])
+        self.assertEqual(operation['consumes'], ['application/xml'])
+
+    def test_consumes_match_form_fields(self):
+        class FormViewSet(ExampleViewSet):
+            parser_classes = [parsers.FormParser, parsers.JSONParser]
+
+        schema_generator = SchemaGenerator(
+            title='Test View',
+            patterns=[url(r'^form/$',
+                          FormViewSet.as_view({'post': 'create'}))]
+        )
+        schema = to_dict(generate_swagger_object(
+            schema_generator.get_schema()))
+        operation = schema['paths']['/form/']['post']
+        self.assertEqual(operation['consumes'],
+                         ['application/x-www-form-urlencoded'])
+        self.assertEqual(
+            set(parameter['in'] for parameter in operation['parameters']),
+            set(['formData']))
+
+    def test_media_types_are_interned(self):
+        schema_generator = SchemaGenerator(title='Test View',
+                                           patterns=urlpatterns)
+        links = [link for keys, link in get_links_from_document(
+            schema_generator.get_schema())]
+        self.assertTrue(all(link._produces is links[0]._produces
+                            for link in links))
+
+
+@unittest.skipUnless(coreapi, 'coreapi is not installed')
+class TestSchemaDefinitions(TestCase):
+    def test_named_schema_is_referenced(self):
+        error = {'code': 'integer', 'message': 'string'}
+
+        @responds(400, "Bad request", schema=error, schema_name='Error')
+        class FirstView(APIView):
+            def get(self, request, *args, **kwargs):
+                return Response()
+
+        @responds(404, "Not found", schema_name='Error')
+        @responds(400, "Bad request", schema={'error': error})
+        class SecondView(APIView):
+            def get(self, request, *args, **kwargs):
+                return Response()
+
+        schema_generator = SchemaGenerator(
+            title='Test View',
+            patterns=[url('^first/$', FirstView.as_view()),
+                      url('^second/$', SecondView.as_view())]
+        )
+        schema = to_dict(generate_swagger_object(
+            schema_generator.get_schema()))
+
+        ref = {'$ref': '#/definitions/Error'}
+        self.assertEqual(schema['definitions'], {
+            'Error': {
+                'type': 'object',
+                'title': None,
+                'properties': {
+                    'code': {'type': 'integer'},
+                    'message': {'type': 'string'},
+                },
+                'required': ['code', 'message'],
+            },
+        })
+        first = schema['paths']['/first/']['get']['responses']
+        self.assertEqual(first['400'], {'description': 'Bad request',
+                                        'schema': ref})
+        second = schema['paths']['/second/']['get']['responses']
+        self.assertEqual(second['404'], {'description': 'Not found',
+                                         'schema': ref})
+        self.assertEqual(second['400']['schema']['properties']['error'],
+                         ref)
+
+        streamed = json.loads(''.join(iter_swagger_json(
+            schema_generator.get_schema())))
+        self.assertEqual(streamed, schema)
+
+    def test_conflicting_names(self):
+        responds(400, "Bad request", schema={'a': 'string'},
+                 schema_name='Conflicting')
+        self.assertRaises(Exception, responds, 400, "Bad request",
+                          schema={'b': 'string'}, schema_name='Conflicting')
+
+
+class TestOpenAPI3(TestCase):
+    def test_components(self):
+        user = {':title': 'User', 'name': 'string'}
+        link = {'href': 'string'}
+
+        @responds(200, "Ok", schema={'user': user, 'next': link},
+                  examples={'application/json': {'user': {'name': 'a'}}})
+        @responds(404, "Not found", schema={'detail': 'string'},
+                  schema_name='NotFound')
+        class FirstView(APIView):
+            def get(self, request, *args, **kwargs):
+                return Response()
+
+        @responds(200, "Ok", schema={'author': user, 'self': link})
+        @responds(404, "Not found", schema_name='NotFound')
+        class SecondView(APIView):
+            def post(self, request, *args, **kwargs):
+                return Response()
+
+        schema_generator = SchemaGenerator(
+            title='Test View',
+            patterns=[url('^first/$', FirstView.as_view()),
+                      url('^second/$', SecondView.as_view())]
+        )
+        document = schema_generator.get_schema()
+        schema = to_dict(generate_openapi3_object(document))
+
+        self.assertEqual(schema['openapi'], '3.0.0')
+        self.assertEqual(sorted(schema['components']['schemas']),
+                         ['NotFound', 'Schema', 'User'])
+        user_ref = {'$ref': '#/components/schemas/User'}
+        self.assertEqual(
+            schema['components']['schemas']['User']['properties']['name'],
+            {'type': 'string'})
+
+        first = schema['paths']['/first/']['get']['responses']
+        content = first['200']['content']['application/json']
+        self.assertEqual(content['schema']['properties']['user'], user_ref)
+        self.assertEqual(content['example'], {'user': {'name': 'a'}})
+        self.assertEqual(first['404']['content']['application/json'], {
+            'schema': {'$ref': '#/components/schemas/NotFound'}})
+
+        second = schema['paths']['/second/']['post']
+        self.assertEqual(second['responses']['200']['content']
+                         ['application/json']['schema']['properties'],
+                         {'author': user_ref,
+                          'self': {'$ref': '#/components/schemas/Schema'}})
+        self.assertNotIn('requestBody', second)
+
+        streamed = json.loads(''.join(OpenAPI3Encoder().iter_json(document)))
+        self.assertEqual(streamed, schema)
+        # Swagger is still encoded from the very same document
+        self.assertEqual(generate_swagger_object(document)['swagger'], '2.0')
+
+    def test_schema_with_several_names(self):
+        error = {'code': 'integer'}
+
+        @responds(400, "Bad request", schema=error,
+                  schema_name='AliasedErrorA')
+        @responds(409, "Conflict", schema=error, schema_name='AliasedErrorB')
+        class AliasedView(APIView):
+            def get(self, request, *args, **kwargs):
+                return Response()
+
+        schema_generator = SchemaGenerator(
+            title='Test View',
+            patterns=[url('^aliased/$', AliasedView.as_view())]
+        )
+        schema = to_dict(generate_openapi3_object(
+            schema_generator.get_schema()))
+        components = schema['components']['schemas']
+        responses = schema['paths']['/aliased/']['get']['responses']
+        for status_code in ('400', '409'):
+            ref = (responses[status_code]['content']['application/json']
+                   ['schema']['$ref'])
+            self.assertIn(ref.split('/')[-1], components)
+
+    def test_paths_relative_to_server(self):
+        schema_generator = SchemaGenerator(title='Test View',
+                                           url='http://api.example.com',
+                                           patterns=urlpatterns)
+        schema = to_dict(generate_openapi3_object(
+            schema_generator.get_schema()))
+        self.assertEqual(schema['servers'][0]['url'],
+                         'http://api.example.com/')
+        self.assertIn('/example/', schema['paths'])
+        self.assertIn('/example/{pk}/', schema['paths'])
+
+    def test_request_body(self):
+        schema_generator = SchemaGenerator(title='Test View',
+                                           patterns=urlpatterns)
+        schema = to_dict(generate_openapi3_object(
+            schema_generator.get_schema()))
+        operation = schema['paths']['/example/']['post']
+        self.assertEqual(
+            sorted(operation['requestBody']['content']),
+            FORM_MEDIA_TYPES)
+        body = operation['requestBody']['content']['application/json']
+        self.assertEqual(body['schema']['required'], ['a'])
+        self.assertEqual(operation['parameters'], [])
+
+        operation = schema['paths']['/example/{pk}/']['get']
+        self.assertEqual(operation['parameters'][0]['in'], 'path')
+
+    def test_codec_supports(self):
+        self.assertEqual(OpenAPI3Codec().supports, ['encoding'])
+        self.assertEqual(SwaggerCodec().supports, ['encoding', 'decoding'])
+
+
 @unittest.skipUnless(coreapi, 'coreapi is not installed')
 @override_settings(ROOT_URLCONF='tests.test_schemas')
 class TestReturnsDecorator(TestCase):
@@ -176,7 +471,7 @@ class TestReturnsDecorator(TestCase):
                         'tags': ['different-example'],
                         'parameters': [],
                         'responses': None,
-                        'produces': ['application/json', 'application/xml']
+                        'produces': ['application/json']
                     }
                 }
             }
@@ -223,7 +518,7 @@ class TestReturnsDecorator(TestCase):
                     'post': {
                         'parameters': [],
                         'operationId': 'create',
-                        'produces': ['application/json', 'application/xml'],
+                        'produces': ['application/json'],
                         'summary': 'Example big comment',
                         'description': 'Example big comment',
                         'tags': ['example-view'],
@@ -253,7 +548,7 @@ class TestReturnsDecorator(TestCase):
                     'get': {
                         'parameters': [],
                         'operationId': 'read',
-                        'produces': ['application/json', 'application/xml'],
+                        'produces': ['application/json'],
                         'summary': 'Example big comment',
                         'description': 'Example big comment',
                         'tags': ['example-view'],
@@ -307,7 +602,7 @@ class TestReturnsDecorator(TestCase):
                         'description':
                         'custom_list_action comment\n' +
                         'Example ViewSet big comment',
-                        'produces': ['application/json', 'application/xml'],
+                        'produces': ['application/json'],
                         'parameters': []
                     }
                 },
@@ -318,7 +613,7 @@ class TestReturnsDecorator(TestCase):
                     'operationId': 'list',
                     'responses': None,
                     'tags': ['example'],
-                    'produces': ['application/json', 'application/xml'],
+                    'produces': ['application/json'],
                     'parameters': [
                         {
                             'required': False,
@@ -342,7 +637,7 @@ class TestReturnsDecorator(TestCase):
                      'tags': ['example'],
                      'summary': 'Example ViewSet big comment',
                      'description': 'Example ViewSet big comment',
-                     'produces': ['application/json', 'application/xml'],
+                     'produces': ['application/json'],
                      'parameters': [
                          {
                              'in': 'body',
@@ -363,14 +658,13 @@ class TestReturnsDecorator(TestCase):
                         'operationId': 'custom_action',
                         'consumes': ['application/json'],
                         'responses': {
-                            '200': {'schema_name': 'custom_action',
-                                    'description': 'Always'}
+                            '200': {'description': 'Always'}
                         },
                         'tags': ['example'],
                         'summary': 'custom_action comment',
                         'description':
                         'custom_action comment\nExample ViewSet big comment',
-                        'produces': ['application/json', 'application/xml'],
+                        'produces': ['application/json'],
                         'parameters': [
                             {
                                 'required': True,
@@ -401,7 +695,7 @@ class TestReturnsDecorator(TestCase):
                         'tags': ['example'],
                         'summary': 'Example ViewSet big comment',
                         'description': 'Example ViewSet big comment',
-                        'produces': ['application/json', 'application/xml'],
+                        'produces': ['application/json'],
                         'parameters': [
                             {'required': True,
                              'description': '',
@@ -416,8 +710,7 @@ class TestReturnsDecorator(TestCase):
                         'tags': ['example'],
                         'summary': 'Example ViewSet big comment',
                         'description': 'Example ViewSet big comment',
-                        'produces':
-                        ['application/json', 'application/xml'],
+                        'produces': ['application/json'],
                         'parameters': [
                             {'required': True,
                              'description': '',
@@ -433,7 +726,7 @@ class TestReturnsDecorator(TestCase):
                         'tags': ['example'],
                         'summary': 'Example ViewSet big comment',
                         'description': 'Example ViewSet big comment',
-                        'produces': ['application/json', 'application/xml'],
+                        'produces': ['application/json'],
                         'parameters': [
                             {'required': True,
                              'description': '',
@@ -460,7 +753,7 @@ class TestReturnsDecorator(TestCase):
                         'summary': 'Example ViewSet big comment',
                         'description': 'Example ViewSet big comment',
                         'consumes': ['application/json'],
-                        'produces': ['application/json', 'application/xml'],
+                        'produces': ['application/json'],
                         'parameters': [
                             {'required': True,
                              'description': '',
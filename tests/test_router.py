@@ -1,14 +1,21 @@
 from __future__ import unicode_literals
 
+import gzip
+import io
+import json
+import os
+
 from django.conf.urls import include, url
 from django.db import models
-from django.test import TestCase
+from django.test import TestCase, override_settings
 from rest_framework import serializers, viewsets
 from rest_framework.decorators import detail_route
 from rest_framework.response import Response
-from rest_framework.test import APIRequestFactory
+from rest_framework.test import APIClient, APIRequestFactory
 
-from drf_swagger_extras.routers import DefaultRouter
+from drf_swagger_extras.cache import SharedSchemaCache
+from drf_swagger_extras.renderers import OpenAPI3Renderer, SwaggerRenderer
+from drf_swagger_extras.routers import DefaultRouter, warm_up
 
 factory = APIRequestFactory()
 
@@ -50,11 +57,48 @@ class MockViewSet(viewsets.ModelViewSet):
 namespaced_router = DefaultRouter()
 namespaced_router.register(r'example', MockViewSet, base_name='example')
 
+schema_router = DefaultRouter(schema_title='Example API',
+                              schema_prerender=True,
+                              schema_precompress=True,
+                              schema_server_timing=True)
+schema_router.register(r'notes', NoteViewSet)
+
+shared_router = DefaultRouter(schema_title='Example API',
+                              schema_prerender=True,
+                              schema_cache_alias='default')
+shared_router.register(r'notes', NoteViewSet)
+
+versioned_router = DefaultRouter(schema_title='Example API',
+                                 schema_versions=['v1', 'v2'])
+versioned_router.register(r'notes', NoteViewSet)
+
+streaming_router = DefaultRouter(schema_title='Example API',
+                                 schema_renderers=[SwaggerRenderer,
+                                                   OpenAPI3Renderer],
+                                 schema_streaming=True)
+streaming_router.register(r'notes', NoteViewSet)
+
+static_schema_file = os.path.join(os.path.dirname(__file__),
+                                  'static_schema.json')
+static_router = DefaultRouter(schema_title='Example API', schema_static_files={
+    'application/vnd.coreapi+json': static_schema_file,
+})
+static_router.register(r'notes', NoteViewSet)
+
 urlpatterns = [
     url(r'^non-namespaced/', include(namespaced_router.urls)),
-    url(r'^namespaced/', include(namespaced_router.urls, namespace='example'))
+    url(r'^namespaced/', include(namespaced_router.urls, namespace='example')),
+    url(r'^schema/', include(schema_router.urls, namespace='schema')),
+    url(r'^static/', include(static_router.urls, namespace='static')),
+    url(r'^shared/', include(shared_router.urls, namespace='shared')),
+    url(r'^versioned/', include(versioned_router.urls,
+                                namespace='versioned')),
+    url(r'^streaming/', include(streaming_router.urls,
+                                namespace='streaming')),
 ]
 
+CORE_JSON = 'application/vnd.coreapi+json'
+
 
 class BasicViewSet(viewsets.ViewSet):
     def list(self, request, *args, **kwargs):
@@ -94,3 +138,239 @@ class TestNameableRoot(TestCase):
     def test_router_has_custom_name(self):
         expected = 'nameable-root'
         self.assertEqual(expected, self.urls[-1].name)
+
+
+@override_settings(ROOT_URLCONF='tests.test_router')
+class TestRootView(TestCase):
+    def setUp(self):
+        namespaced_router._root_paths.invalidate()
+
+    def test_root_links(self):
+        client = APIClient()
+        response = client.get('/namespaced/')
+        self.assertEqual(response.data, {
+            'example': 'http://testserver/namespaced/example/',
+        })
+        response = client.get('/non-namespaced/', SERVER_NAME='other')
+        self.assertEqual(response.data, {
+            'example': 'http://other/non-namespaced/example/',
+        })
+        self.assertEqual(len(namespaced_router._root_paths), 2)
+
+        response = client.get('/namespaced/', SERVER_NAME='other')
+        self.assertEqual(response.data, {
+            'example': 'http://other/namespaced/example/',
+        })
+        self.assertEqual(len(namespaced_router._root_paths), 2)
+
+    def test_root_paths_bounded(self):
+        # Clients pick the version, thus the number of keys
+        root_paths = namespaced_router._root_paths
+        for version in range(root_paths.maxsize + 1):
+            root_paths.set(('namespaced', str(version), (), ()), [])
+        self.assertEqual(len(root_paths), root_paths.maxsize)
+
+
+class TestLazySchemaGenerator(TestCase):
+    def test_single_lazy_generator(self):
+        router = DefaultRouter(schema_title='Example API')
+        router.register(r'notes', NoteViewSet)
+        router.register(r'kwarged', KWargedNoteViewSet, base_name='kwarged')
+        router.urls
+        self.assertIsNone(router._schema_generator)
+
+        generator = router.get_schema_generator()
+        self.assertIs(generator, router.get_schema_generator())
+        self.assertEqual(generator.title, 'Example API')
+
+
+@override_settings(ROOT_URLCONF='tests.test_router')
+class TestPrerenderedSchema(TestCase):
+    def setUp(self):
+        schema_router.invalidate_schema_cache()
+        self.client = APIClient()
+
+    def test_etag(self):
+        response = self.client.get('/schema/', HTTP_ACCEPT=CORE_JSON)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith(CORE_JSON))
+        etag = response['ETag']
+
+        response = self.client.get('/schema/', HTTP_ACCEPT=CORE_JSON,
+                                   HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+        response = self.client.get('/schema/', HTTP_ACCEPT=CORE_JSON,
+                                   HTTP_IF_NONE_MATCH='"other"')
+        self.assertEqual(response.status_code, 200)
+
+    def test_warm_up(self):
+        warm_up('/schema/')
+        self.assertEqual(len(schema_router.schema_cache), 1)
+        self.assertEqual(len(schema_router.payload_cache), 1)
+
+        response = self.client.get('/schema/', HTTP_ACCEPT=CORE_JSON)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('Server-Timing', response)
+
+    def test_warm_up_namespace(self):
+        schema_router.warm_up(namespace='schema')
+        self.assertEqual(len(schema_router.schema_cache), 1)
+        self.assertEqual(len(schema_router.payload_cache), 1)
+
+    def test_server_timing(self):
+        # Start from a fresh generator, with no links cached
+        schema_router._schema_generator = None
+        response = self.client.get('/schema/', HTTP_ACCEPT=CORE_JSON)
+        phases = [metric.split(';')[0]
+                  for metric in response['Server-Timing'].split(', ')]
+        self.assertIn('schema', phases)
+        self.assertIn('serializer_fields', phases)
+        self.assertIn('render', phases)
+
+        response = self.client.get('/schema/', HTTP_ACCEPT=CORE_JSON)
+        self.assertNotIn('Server-Timing', response)
+
+    def test_precompressed(self):
+        plain = self.client.get('/schema/', HTTP_ACCEPT=CORE_JSON)
+        compressed = self.client.get('/schema/', HTTP_ACCEPT=CORE_JSON,
+                                     HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(compressed['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', compressed['Vary'])
+        self.assertNotEqual(plain['ETag'], compressed['ETag'])
+        with gzip.GzipFile(fileobj=io.BytesIO(compressed.content)) as fh:
+            self.assertEqual(fh.read(), plain.content)
+
+        response = self.client.get('/schema/', HTTP_ACCEPT=CORE_JSON,
+                                   HTTP_ACCEPT_ENCODING='gzip',
+                                   HTTP_IF_NONE_MATCH=compressed['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_refused_encodings(self):
+        for accept_encoding in ('identity, gzip;q=0', 'gzip;q=0, br;q=0, *',
+                                'identity;q=1, *;q=0', 'xgzip'):
+            response = self.client.get('/schema/', HTTP_ACCEPT=CORE_JSON,
+                                       HTTP_ACCEPT_ENCODING=accept_encoding)
+            self.assertNotIn('Content-Encoding', response)
+
+        response = self.client.get('/schema/', HTTP_ACCEPT=CORE_JSON,
+                                   HTTP_ACCEPT_ENCODING='GZIP;q=0.5')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+
+
+@override_settings(ROOT_URLCONF='tests.test_router')
+class TestSharedSchemaCache(TestCase):
+    def setUp(self):
+        shared_router.invalidate_schema_cache()
+        self.client = APIClient()
+
+    def test_shared_between_processes(self):
+        response = self.client.get('/shared/', HTTP_ACCEPT=CORE_JSON)
+        self.assertEqual(response.status_code, 200)
+
+        # Another process starts with empty in-process caches
+        shared_router.schema_cache.invalidate()
+        shared_router.payload_cache.invalidate()
+        shared_router._schema_generator = None
+        other = self.client.get('/shared/', HTTP_ACCEPT=CORE_JSON)
+        # Served without generating the schema again
+        self.assertIsNone(shared_router._schema_generator)
+        self.assertEqual(other['ETag'], response['ETag'])
+        self.assertEqual(other.content, response.content)
+
+    def test_invalidate(self):
+        self.client.get('/shared/', HTTP_ACCEPT=CORE_JSON)
+        version = shared_router.get_schema_version()
+        shared_router.invalidate_schema_cache()
+        shared_router._schema_generator = None
+        self.client.get('/shared/', HTTP_ACCEPT=CORE_JSON)
+        self.assertEqual(shared_router.get_schema_version(), version)
+        # Built again, as the shared entries were invalidated too
+        self.assertTrue(shared_router.get_schema_generator()._links)
+
+    def test_lock_timeout(self):
+        shared = shared_router.shared_schema_cache
+        key = shared.make_key(('missing',))
+        shared.cache.add(key + ':lock', True)
+        shared.lock_timeout = 0.1
+        try:
+            self.assertEqual(shared.get_or_build(('missing',), lambda: 1), 1)
+        finally:
+            shared.lock_timeout = shared_router.schema_cache_lock_timeout
+            shared.cache.delete(key + ':lock')
+        self.assertEqual(shared.get_or_build(('missing',), lambda: 2), 1)
+
+    def test_shared_entries_expire(self):
+        self.assertEqual(shared_router.shared_schema_cache.timeout,
+                         DefaultRouter.schema_cache_timeout)
+        router = DefaultRouter(schema_cache_alias='default',
+                               schema_cache_timeout=None)
+        self.assertEqual(router.shared_schema_cache.timeout,
+                         DefaultRouter.schema_shared_cache_timeout)
+
+
+@override_settings(ROOT_URLCONF='tests.test_router')
+class TestVersionedSchema(TestCase):
+    def test_versions_built_together(self):
+        versioned_router.invalidate_schema_cache()
+        client = APIClient()
+        response = client.get('/versioned/schema/v1/', HTTP_ACCEPT=CORE_JSON)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(versioned_router.schema_cache), 2)
+
+        response = client.get('/versioned/schema/v2/', HTTP_ACCEPT=CORE_JSON)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(versioned_router.schema_cache), 2)
+
+        response = client.get('/versioned/schema/v3/', HTTP_ACCEPT=CORE_JSON)
+        self.assertEqual(response.status_code, 404)
+
+    def test_versions_shared(self):
+        versioned_router.invalidate_schema_cache()
+        shared = versioned_router.shared_schema_cache = SharedSchemaCache()
+        try:
+            client = APIClient()
+            client.get('/versioned/schema/v1/', HTTP_ACCEPT=CORE_JSON)
+            version = versioned_router.get_schema_version()
+            for key in list(versioned_router.schema_cache._data):
+                self.assertIsNotNone(
+                    shared.cache.get(shared.make_key((version,) + key)))
+        finally:
+            shared.invalidate()
+            versioned_router.shared_schema_cache = None
+
+
+@override_settings(ROOT_URLCONF='tests.test_router')
+class TestStaticSchema(TestCase):
+    def test_serves_static_file(self):
+        client = APIClient()
+        response = client.get('/static/', HTTP_ACCEPT=CORE_JSON)
+        self.assertEqual(response.status_code, 200)
+        with open(static_schema_file, 'rb') as fh:
+            self.assertEqual(response.content, fh.read())
+        self.assertIn('ETag', response)
+
+
+@override_settings(ROOT_URLCONF='tests.test_router')
+class TestStreamingSchema(TestCase):
+    def test_streams_swagger(self):
+        client = APIClient()
+        response = client.get('/streaming/',
+                              HTTP_ACCEPT='application/openapi+json')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        swagger = json.loads(b''.join(response.streaming_content)
+                             .decode('utf-8'))
+        self.assertEqual(swagger['info']['title'], 'Example API')
+        self.assertIn('/notes/', swagger['paths'])
+
+    def test_streams_openapi3(self):
+        client = APIClient()
+        response = client.get('/streaming/',
+                              HTTP_ACCEPT=OpenAPI3Renderer.media_type)
+        self.assertTrue(response.streaming)
+        schema = json.loads(b''.join(response.streaming_content)
+                            .decode('utf-8'))
+        self.assertEqual(schema['openapi'], '3.0.0')
+        self.assertIn('/notes/', schema['paths'])
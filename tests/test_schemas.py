@@ -5,18 +5,33 @@ import unittest
 
 from django.conf.urls import include, url
 from django.test import TestCase, override_settings
-from rest_framework import filters, pagination, permissions, serializers
-from rest_framework.compat import coreapi
+from rest_framework import (
+    filters, mixins, pagination, permissions, serializers
+)
+from rest_framework.compat import apply_markdown, coreapi
 from rest_framework.decorators import detail_route, list_route
 from rest_framework.response import Response
 from rest_framework.schemas import SchemaGenerator as BaseSchemaGenerator
-from rest_framework.test import APIClient
+from rest_framework.test import (
+    APIClient, APIRequestFactory, force_authenticate
+)
 from rest_framework.views import APIView
-from rest_framework.viewsets import ModelViewSet
+from rest_framework.viewsets import GenericViewSet, ModelViewSet
 
+from drf_swagger_extras.decorators import responds
+from drf_swagger_extras.encoders import generate_swagger_object
+from drf_swagger_extras.profiling import activate
 from drf_swagger_extras.routers import DefaultRouter
 from drf_swagger_extras.schemas import SchemaGenerator, description_format
-from openapi_codec.encode import generate_swagger_object
+from drf_swagger_extras.signals import schema_profiled
+from openapi_codec import encode as openapi_encode
+from openapi_codec.utils import get_links_from_document
+
+# Django 1.10 moves .core.urlresolvers to .urls
+try:
+    from django.urls import resolve
+except ImportError:
+    from django.core.urlresolvers import resolve
 
 
 class MockUser(object):
@@ -287,6 +302,93 @@ class TestRouterGeneratedSchema(TestCase):
         )
         self.assertEqual(response.data, expected)
 
+    def test_cache_key_per_credentials(self):
+        factory = APIRequestFactory()
+
+        def get_key(user, token=None):
+            request = factory.get('/')
+            force_authenticate(request, user, token)
+            request = APIView().initialize_request(request)
+            request.resolver_match = resolve('/')
+            request.version = None
+            return router.get_schema_cache_key(request)
+
+        user = MockUser()
+        self.assertEqual(get_key(user, 'read'), get_key(user, 'read'))
+        self.assertNotEqual(get_key(user, 'read'), get_key(user, 'write'))
+        staff = MockUser()
+        staff.is_staff = True
+        self.assertNotEqual(get_key(user), get_key(staff))
+        # So that permission changes eventually show up
+        self.assertIsNotNone(router.schema_cache.timeout)
+
+    def test_schema_is_cached(self):
+        router.invalidate_schema_cache()
+        client = APIClient()
+        first = client.get('/', HTTP_ACCEPT='application/vnd.coreapi+json')
+        second = client.get('/', HTTP_ACCEPT='application/vnd.coreapi+json')
+        self.assertIs(first.data, second.data)
+
+        client.force_authenticate(MockUser())
+        third = client.get('/', HTTP_ACCEPT='application/vnd.coreapi+json')
+        self.assertIsNot(first.data, third.data)
+
+        router.invalidate_schema_cache()
+        client.logout()
+        fourth = client.get('/', HTTP_ACCEPT='application/vnd.coreapi+json')
+        self.assertEqual(first.data, fourth.data)
+
+    def test_invalidate_introspects_again(self):
+        class Serializer(serializers.Serializer):
+            a = serializers.CharField()
+
+        class InvalidatedViewSet(ModelViewSet):
+            serializer_class = Serializer
+
+        local_router = DefaultRouter(schema_title='Example API')
+        local_router.register('invalidated', InvalidatedViewSet,
+                              base_name='invalidated')
+        local_router.urls
+        request = APIView().initialize_request(APIRequestFactory().get('/'))
+
+        def get_fields():
+            schema = local_router.get_schema_generator().get_schema(request)
+            return [field.name for field in
+                    schema['invalidated']['create'].fields]
+
+        self.assertEqual(get_fields(), ['a'])
+        Serializer._declared_fields['b'] = serializers.CharField()
+        local_router.invalidate_schema_cache()
+        self.assertEqual(get_fields(), ['a', 'b'])
+
+    def test_documents_shared_per_permissions(self):
+        factory = APIRequestFactory()
+        schema_generator = SchemaGenerator(title='Example API',
+                                           patterns=urlpatterns)
+
+        def get_schema(user=None):
+            request = factory.get('/')
+            force_authenticate(request, user)
+            return schema_generator.get_schema(
+                APIView().initialize_request(request))
+
+        anonymous = get_schema()
+        self.assertIs(anonymous, get_schema())
+        authenticated = get_schema(MockUser())
+        self.assertIsNot(anonymous, authenticated)
+        self.assertIs(authenticated, get_schema(MockUser()))
+        self.assertIs(anonymous['example']['list'],
+                      authenticated['example']['list'])
+
+    def test_documents_not_cached_without_links(self):
+        schema_generator = SchemaGenerator(title='Example API',
+                                           patterns=urlpatterns)
+        schema_generator.cache_links = False
+        request = APIView().initialize_request(APIRequestFactory().get('/'))
+        self.assertEqual(schema_generator.get_schema(request),
+                         schema_generator.get_schema(request))
+        self.assertEqual(len(schema_generator._documents), 0)
+
 
 @unittest.skipUnless(coreapi, 'coreapi is not installed')
 class TestSchemaGenerator(TestCase):
@@ -322,6 +424,298 @@ class TestSchemaGenerator(TestCase):
         )
         self.assertEquals(schema, expected)
 
+    def test_parallel_introspection(self):
+        serial = SchemaGenerator(title='Test View', patterns=urlpatterns2)
+        parallel = SchemaGenerator(title='Test View', patterns=urlpatterns2,
+                                   workers=4)
+        self.assertEqual(serial.get_schema(), parallel.get_schema())
+
+    def test_profiling(self):
+        profiles = []
+
+        def receiver(sender, generator, request, profile, **kwargs):
+            profiles.append(profile)
+
+        schema_generator = SchemaGenerator(
+            title='Test View', patterns=urlpatterns2,
+            profile_callback=profiles.append)
+        schema_profiled.connect(receiver)
+        try:
+            schema = schema_generator.get_schema()
+        finally:
+            schema_profiled.disconnect(receiver)
+
+        self.assertEqual(len(profiles), 2)
+        self.assertIs(profiles[0], profiles[1])
+        profile = profiles[0]
+        self.assertIn('schema', profile.phases)
+        self.assertEqual(
+            list(profile.endpoints[('/example-view/', 'GET')]),
+            ['path_fields', 'serializer_fields', 'pagination_fields',
+             'filter_fields', 'description', 'link', 'responses',
+             'produces'])
+
+        with activate(profile):
+            generate_swagger_object(schema)
+        self.assertIn('encode', profile.endpoints[('/example-view/', 'GET')])
+
+    def test_endpoint_context(self):
+        schema_generator = SchemaGenerator(title='Test View',
+                                           patterns=urlpatterns)
+        path, method, category, action, callback = [
+            endpoint for endpoint in
+            schema_generator.get_api_endpoints(urlpatterns)
+            if endpoint[3] == 'custom_action'
+        ][0]
+        view = schema_generator.create_view(path, method, callback)
+        context = schema_generator.get_endpoint_context(
+            path, method, callback, view)
+
+        self.assertIs(context, schema_generator.get_endpoint_context(
+            path, method, callback, view))
+        self.assertEqual(context.action.__name__, 'custom_action')
+        self.assertEqual(context.description, description_format(
+            ExampleViewSet.__doc__, ExampleViewSet.custom_action.__doc__))
+
+    def test_serializer_fields_are_shared(self):
+        class CountedSerializer(serializers.Serializer):
+            instances = 0
+            a = serializers.CharField(required=True)
+
+            def __init__(self, *args, **kwargs):
+                type(self).instances += 1
+                super(CountedSerializer, self).__init__(*args, **kwargs)
+
+        class DynamicSerializer(CountedSerializer):
+            instances = 0
+            schema_dynamic_fields = True
+
+        class FirstViewSet(ModelViewSet):
+            serializer_class = CountedSerializer
+
+        class SecondViewSet(FirstViewSet):
+            pass
+
+        class DynamicViewSet(ModelViewSet):
+            serializer_class = DynamicSerializer
+
+        router = DefaultRouter()
+        router.register('first', FirstViewSet, base_name='first')
+        router.register('second', SecondViewSet, base_name='second')
+        router.register('dynamic', DynamicViewSet, base_name='dynamic')
+        schema_generator = SchemaGenerator(title='Test View',
+                                           patterns=router.urls)
+        schema = schema_generator.get_schema()
+
+        # Once for POST/PUT, and once for PATCH
+        self.assertEqual(CountedSerializer.instances, 2)
+        self.assertIs(schema['first']['create'].fields[0],
+                      schema['second']['create'].fields[0])
+        self.assertFalse(schema['first']['partial_update'].fields[1].required)
+        # POST, PUT and PATCH
+        self.assertEqual(DynamicSerializer.instances, 3)
+
+    def test_query_fields_are_shared(self):
+        class CountedPagination(ExamplePagination):
+            instances = 0
+
+            def __init__(self):
+                CountedPagination.instances += 1
+
+        class CountedFilter(filters.OrderingFilter):
+            instances = 0
+
+            def __init__(self):
+                CountedFilter.instances += 1
+
+        class FirstViewSet(ModelViewSet):
+            serializer_class = ExampleSerializer
+            pagination_class = CountedPagination
+            filter_backends = [CountedFilter]
+
+        class SecondViewSet(FirstViewSet):
+            pass
+
+        router = DefaultRouter()
+        router.register('first', FirstViewSet, base_name='first')
+        router.register('second', SecondViewSet, base_name='second')
+        schema_generator = SchemaGenerator(title='Test View',
+                                           patterns=router.urls)
+        schema = schema_generator.get_schema()
+
+        self.assertEqual(CountedPagination.instances, 1)
+        # Once per view class
+        self.assertEqual(CountedFilter.instances, 2)
+        self.assertEqual(schema['first']['list'].fields,
+                         schema['second']['list'].fields)
+        self.assertEqual(len(schema['first']['retrieve'].fields), 1)
+
+    def test_versions(self):
+        class VersionedViewSet(ModelViewSet):
+            def get_serializer_class(self):
+                if self.request.version == 'v1':
+                    return ExampleSerializer
+                return AnotherSerializer
+
+        class ConstantViewSet(ModelViewSet):
+            serializer_class = ExampleSerializer
+
+        router = DefaultRouter()
+        router.register('versioned', VersionedViewSet, base_name='versioned')
+        router.register('constant', ConstantViewSet, base_name='constant')
+        schema_generator = SchemaGenerator(title='Test View',
+                                           patterns=router.urls)
+        schemas = schema_generator.get_schemas(['v1', 'v2', 'v3'])
+
+        self.assertEqual(list(schemas), ['v1', 'v2', 'v3'])
+        self.assertIs(schemas['v1']['constant']['create'],
+                      schemas['v2']['constant']['create'])
+        for version, names in [('v1', ['a', 'b']), ('v2', ['c', 'd'])]:
+            link = schemas[version]['versioned']['create']
+            self.assertEqual([field.name for field in link.fields], names)
+        # Identical versions share their document
+        self.assertIs(schemas['v2'], schemas['v3'])
+
+    def test_links_are_reused(self):
+        class CachedView(APIView):
+            def get(self, request, *args, **kwargs):
+                return Response()
+
+        schema_generator = SchemaGenerator(
+            title='Test View',
+            patterns=[url(r'^cached/$', CachedView.as_view())])
+        first = schema_generator.get_schema()
+        second = schema_generator.get_schema()
+        self.assertIs(first['cached']['read'], second['cached']['read'])
+
+        responds(404, 'Not found')(CachedView)
+        third = schema_generator.get_schema()
+        self.assertIsNot(first['cached']['read'], third['cached']['read'])
+        self.assertIn(404, third['cached']['read']._responses)
+
+    def test_fingerprint(self):
+        class FingerprintedView(APIView):
+            def get(self, request, *args, **kwargs):
+                return Response()
+
+        patterns = [url(r'^fingerprinted/$', FingerprintedView.as_view())]
+        schema_generator = SchemaGenerator(title='Test View',
+                                           patterns=patterns)
+        fingerprint = schema_generator.get_fingerprint()
+        self.assertEqual(fingerprint, SchemaGenerator(
+            title='Test View', patterns=patterns).get_fingerprint())
+        # Computed without building any link
+        self.assertEqual(schema_generator._links, {})
+
+        responds(404, 'Not found')(FingerprintedView)
+        self.assertNotEqual(schema_generator.get_fingerprint(), fingerprint)
+
+    def test_uncached_links_see_decorators(self):
+        class UndecoratedView(APIView):
+            def get(self, request, *args, **kwargs):
+                return Response()
+
+        patterns = [url(r'^undecorated/$', UndecoratedView.as_view())]
+        schema_generator = SchemaGenerator(title='Test View',
+                                           patterns=patterns)
+        schema_generator.cache_links = False
+        link = schema_generator.get_schema()['undecorated']['read']
+        self.assertFalse(link._responses)
+
+        responds(404, 'Not found')(UndecoratedView)
+        link = schema_generator.get_schema()['undecorated']['read']
+        self.assertIn(404, link._responses)
+
+    def test_fingerprint_serializer_fields(self):
+        class FieldsView(APIView):
+            serializer_class = AnotherSerializer
+
+            def post(self, request, *args, **kwargs):
+                return Response()
+
+        patterns = [url(r'^fields/$', FieldsView.as_view())]
+        fingerprint = SchemaGenerator(patterns=patterns).get_fingerprint()
+
+        FieldsView.serializer_class = ExampleSerializer
+        self.assertNotEqual(
+            SchemaGenerator(patterns=patterns).get_fingerprint(), fingerprint)
+
+    def test_fingerprint_view_settings(self):
+        class Serializer(serializers.Serializer):
+            a = serializers.CharField()
+
+        class FingerprintPagination(ExamplePagination):
+            pass
+
+        class SettingsViewSet(ModelViewSet):
+            pagination_class = FingerprintPagination
+
+            def get_serializer_class(self):
+                return Serializer
+
+        router = DefaultRouter()
+        router.register('settings', SettingsViewSet, base_name='settings')
+
+        def get_fingerprint():
+            return SchemaGenerator(patterns=router.urls).get_fingerprint()
+
+        fingerprint = get_fingerprint()
+        Serializer._declared_fields['b'] = serializers.CharField()
+        self.assertNotEqual(get_fingerprint(), fingerprint)
+
+        fingerprint = get_fingerprint()
+        FingerprintPagination.page_size_query_param = 'size'
+        self.assertNotEqual(get_fingerprint(), fingerprint)
+
+        fingerprint = get_fingerprint()
+        SettingsViewSet.permission_classes = [permissions.IsAuthenticated]
+        self.assertNotEqual(get_fingerprint(), fingerprint)
+
+    def test_fingerprint_contextual_serializer(self):
+        class ContextSerializer(serializers.Serializer):
+            a = serializers.CharField()
+
+            def __init__(self, *args, **kwargs):
+                super(ContextSerializer, self).__init__(*args, **kwargs)
+                self.user = self.context['request'].user
+
+        class ContextViewSet(mixins.ListModelMixin, GenericViewSet):
+            serializer_class = ContextSerializer
+
+        router = DefaultRouter()
+        router.register('context', ContextViewSet, base_name='context')
+        # Falls back to the name of the serializer class
+        self.assertTrue(
+            SchemaGenerator(patterns=router.urls).get_fingerprint())
+
+    def test_refresh_drops_stale_links(self):
+        patterns = list(urlpatterns2)
+        schema_generator = SchemaGenerator(title='Test View',
+                                           patterns=patterns)
+        schema_generator.get_schema()
+        self.assertEqual(len(schema_generator._links), 2)
+
+        del patterns[:]
+        schema_generator.refresh()
+        self.assertEqual(schema_generator._links, {})
+
+    def test_description_is_memoized(self):
+        generic = "Generic\n    description"
+        description = description_format(generic, "Specific")
+        self.assertEqual(description, "Specific\nGeneric\ndescription")
+        self.assertIs(description, description_format(generic, "Specific"))
+
+    @unittest.skipUnless(apply_markdown, 'markdown is not installed')
+    def test_markdown_description(self):
+        class MarkdownGenerator(SchemaGenerator):
+            markdown_descriptions = True
+
+        schema_generator = MarkdownGenerator(title='Test View',
+                                             patterns=urlpatterns2)
+        schema = schema_generator.get_schema()
+        self.assertEqual(schema['example-view']['read'].description,
+                         '<p>Example big comment</p>')
+
     def test_base_generator(self):
         """Avoid regressions on BaseSchemaGenerator due to monkey-patching"""
         schema_generator = BaseSchemaGenerator(title='Test View',
@@ -347,3 +741,20 @@ class TestSchemaGenerator(TestCase):
         ))
 
         self.assertEquals(schema, expected)
+
+    def test_openapi_codec_is_not_patched(self):
+        schema_generator = SchemaGenerator(title='Test View',
+                                           patterns=urlpatterns2)
+        document = schema_generator.get_schema()
+        for keys, link in get_links_from_document(document):
+            link._responses = {404: {'description': 'Not found'}}
+
+        schema = openapi_encode.generate_swagger_object(document)
+        operation = schema['paths']['/example-view/']['get']
+        self.assertEqual(operation['responses'], {'200': {'description': ''}})
+        self.assertNotIn('produces', operation)
+
+        operation = generate_swagger_object(
+            document)['paths']['/example-view/']['get']
+        self.assertEqual(operation['responses'],
+                         {404: {'description': 'Not found'}})
@@ -0,0 +1,140 @@
+from __future__ import unicode_literals
+
+from django.conf.urls import url
+from django.test import TestCase, override_settings
+from rest_framework.response import Response
+from rest_framework.test import APIClient
+from rest_framework.views import APIView
+
+from drf_swagger_extras.decorators import compile_schema, responds
+from drf_swagger_extras.signals import response_violated
+from drf_swagger_extras.validation import (
+    ResponseValidationMiddleware, ResponseValidationMixin, get_validator
+)
+
+NOTE_SCHEMA = {
+    'id': 'integer',
+    'title': 'string',
+    ('tags', 'norequired'): [],
+    'author': {
+        'name': 'string',
+        'active': 'boolean',
+    },
+}
+
+
+class NoteView(APIView):
+    data = None
+
+    @responds(200, 'A note', schema=NOTE_SCHEMA)
+    def get(self, request, *args, **kwargs):
+        return Response(self.data)
+
+
+class ValidatedNoteView(ResponseValidationMixin, NoteView):
+    response_validation_rate = 1
+
+
+class AlwaysValidationMiddleware(ResponseValidationMiddleware):
+    response_validation_rate = 1
+    response_validation_max_size = 100
+
+
+class NeverValidationMiddleware(ResponseValidationMiddleware):
+    response_validation_rate = 0
+
+
+VALID_NOTE = {
+    'id': 1,
+    'title': 'Hello',
+    'author': {'name': 'Someone', 'active': True},
+}
+
+urlpatterns = [
+    url(r'^note/$', NoteView.as_view(data=VALID_NOTE)),
+    url(r'^invalid-note/$', NoteView.as_view(data={'id': 'one'})),
+    url(r'^large-note/$', NoteView.as_view(data={'id': 'one' * 100})),
+    url(r'^validated-note/$', ValidatedNoteView.as_view(data={
+        'id': True, 'title': None, 'author': {'name': 'Someone'},
+    })),
+]
+
+
+class TestValidators(TestCase):
+    def validate(self, value):
+        errors = []
+        get_validator(compile_schema(NOTE_SCHEMA))(value, '$', errors)
+        return errors
+
+    def test_valid(self):
+        self.assertEqual(self.validate(VALID_NOTE), [])
+
+    def test_invalid(self):
+        self.assertEqual(sorted(self.validate({
+            'id': 1.5,
+            'title': 'Hello',
+            'tags': 'a,b',
+            'author': {'name': 'Someone', 'active': 1},
+        })), [
+            '$.author.active: expected boolean',
+            '$.id: expected integer',
+            '$.tags: expected list',
+        ])
+        self.assertEqual(self.validate([]), ['$: expected an object'])
+
+    def test_compiled_once(self):
+        node = compile_schema(NOTE_SCHEMA)
+        self.assertIs(get_validator(node), get_validator(node))
+
+
+@override_settings(ROOT_URLCONF='tests.test_validation')
+class TestResponseValidation(TestCase):
+    def setUp(self):
+        self.violations = []
+        response_violated.connect(self.receiver)
+
+    def tearDown(self):
+        response_violated.disconnect(self.receiver)
+
+    def receiver(self, sender, errors, **kwargs):
+        self.violations.append((sender, sorted(errors)))
+
+    def test_mixin(self):
+        response = APIClient().get('/validated-note/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.violations, [(ValidatedNoteView, [
+            '$.author.active: missing',
+            '$.id: expected integer',
+        ])])
+
+    def test_not_sampled(self):
+        with override_settings(MIDDLEWARE_CLASSES=[
+                'tests.test_validation.NeverValidationMiddleware'
+        ]):
+            for i in range(10):
+                APIClient().get('/invalid-note/')
+        self.assertEqual(self.violations, [])
+
+    @override_settings(MIDDLEWARE_CLASSES=[
+        'tests.test_validation.AlwaysValidationMiddleware',
+    ])
+    def test_middleware(self):
+        client = APIClient()
+        self.assertEqual(client.get('/note/').status_code, 200)
+        self.assertEqual(self.violations, [])
+
+        response = client.get('/invalid-note/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.violations, [(NoteView, [
+            '$.author: missing',
+            '$.id: expected integer',
+            '$.title: missing',
+        ])])
+
+    @override_settings(MIDDLEWARE_CLASSES=[
+        'tests.test_validation.AlwaysValidationMiddleware',
+    ])
+    def test_max_size(self):
+        response = APIClient().get('/large-note/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.violations, [])